@@ -27,6 +27,144 @@ JWT_EXPIRATION_HOURS = 168  # 7 days
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@learnhub.com")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
 
+# -------------------------------------------------
+# PROGRESS
+# -------------------------------------------------
+# "summary"  -> materialized student_progress documents
+# "pipeline" -> aggregate test_results in Mongo on every read
+PROGRESS_SOURCE = os.getenv("PROGRESS_SOURCE", "summary")
+
+# -------------------------------------------------
+# ANALYTICS
+# -------------------------------------------------
+ANALYTICS_ROLLUP_INTERVAL_SECONDS = int(os.getenv("ANALYTICS_ROLLUP_INTERVAL_SECONDS", "60"))
+
+# -------------------------------------------------
+# BLOB STORAGE
+# -------------------------------------------------
+# "gridfs" -> MongoDB GridFS bucket, "local" -> files under BLOB_DIR
+# (only for hosts with a persistent disk; Render's is wiped on deploy)
+BLOB_STORE = os.getenv("BLOB_STORE", "gridfs")
+BLOB_DIR = os.getenv("BLOB_DIR", str(ROOT_DIR / "blobs"))
+# Backend origin for blob URLs handed to clients; the frontend is served
+# from another host. Render sets RENDER_EXTERNAL_URL; otherwise the
+# origin of the current request is used.
+PUBLIC_API_URL = (
+    os.getenv("PUBLIC_API_URL") or os.getenv("RENDER_EXTERNAL_URL", "")
+).rstrip("/")
+# Blob URLs are signed; a URL stays valid (and cacheable) this long
+BLOB_URL_TTL_SECONDS = int(os.getenv("BLOB_URL_TTL_SECONDS", "86400"))
+
+# -------------------------------------------------
+# DOUBTS
+# -------------------------------------------------
+DOUBT_LEASE_SECONDS = int(os.getenv("DOUBT_LEASE_SECONDS", "600"))
+SIMILAR_DOUBTS_DIM = int(os.getenv("SIMILAR_DOUBTS_DIM", "512"))
+SIMILAR_DOUBTS_MIN_SCORE = float(os.getenv("SIMILAR_DOUBTS_MIN_SCORE", "0.35"))
+# Picks up doubts answered through other workers
+SIMILAR_DOUBTS_REFRESH_SECONDS = int(os.getenv("SIMILAR_DOUBTS_REFRESH_SECONDS", "60"))
+
+# -------------------------------------------------
+# NOTIFICATIONS
+# -------------------------------------------------
+# "memory" -> single worker, "mongo" -> capped collection shared by workers
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+NOTIFICATION_RECONCILE_SECONDS = int(os.getenv("NOTIFICATION_RECONCILE_SECONDS", "3600"))
+NOTIFICATION_READ_TTL_DAYS = int(os.getenv("NOTIFICATION_READ_TTL_DAYS", "30"))
+NOTIFICATION_MAX_PER_USER = int(os.getenv("NOTIFICATION_MAX_PER_USER", "200"))
+NOTIFICATION_COMPACT_SECONDS = int(os.getenv("NOTIFICATION_COMPACT_SECONDS", "86400"))
+# Explicit user lists up to this size get per-user notifications
+BROADCAST_FANOUT_MAX = int(os.getenv("BROADCAST_FANOUT_MAX", "50"))
+
+# -------------------------------------------------
+# OUTBOX
+# -------------------------------------------------
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+
+# -------------------------------------------------
+# LLM PROVIDERS
+# -------------------------------------------------
+# "openrouter" or "mock" (deterministic, offline; for local runs and benchmarks)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openrouter")
+# Model per task; each task can also override the provider
+LLM_GENERATION_MODEL = os.getenv("LLM_GENERATION_MODEL", "openai/gpt-oss-20b:free")
+LLM_GENERATION_PROVIDER = os.getenv("LLM_GENERATION_PROVIDER", LLM_PROVIDER)
+LLM_REPAIR_MODEL = os.getenv("LLM_REPAIR_MODEL", LLM_GENERATION_MODEL)
+LLM_REPAIR_PROVIDER = os.getenv("LLM_REPAIR_PROVIDER", LLM_GENERATION_PROVIDER)
+LLM_TRANSCRIPTION_MODEL = os.getenv("LLM_TRANSCRIPTION_MODEL", "google/gemini-2.5-flash-lite")
+LLM_TRANSCRIPTION_PROVIDER = os.getenv("LLM_TRANSCRIPTION_PROVIDER", LLM_PROVIDER)
+# Backup model raced against a slow primary ("" disables hedging)
+LLM_GENERATION_HEDGE_MODEL = os.getenv("LLM_GENERATION_HEDGE_MODEL", "")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Latency samples needed before the percentile is trusted
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_MOCK_LATENCY_MS = float(os.getenv("LLM_MOCK_LATENCY_MS", "0"))
+# Admission control: concurrent model calls per worker and waiting room
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "200"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "120"))
+# Per-user budgets over a sliding window (admins are exempt)
+LLM_BUDGET_WINDOW_SECONDS = int(os.getenv("LLM_BUDGET_WINDOW_SECONDS", "3600"))
+LLM_USER_REQUESTS_PER_WINDOW = int(os.getenv("LLM_USER_REQUESTS_PER_WINDOW", "60"))
+LLM_USER_TOKENS_PER_WINDOW = int(os.getenv("LLM_USER_TOKENS_PER_WINDOW", "300000"))
+
+# -------------------------------------------------
+# AI GENERATION
+# -------------------------------------------------
+# Large papers are split into chunks generated concurrently
+GENERATION_CHUNK_SIZE = int(os.getenv("GENERATION_CHUNK_SIZE", "10"))
+GENERATION_CHUNK_CONCURRENCY = int(os.getenv("GENERATION_CHUNK_CONCURRENCY", "4"))
+GENERATION_CHUNK_RETRIES = int(os.getenv("GENERATION_CHUNK_RETRIES", "2"))
+
+# -------------------------------------------------
+# AI GENERATION CACHE
+# -------------------------------------------------
+GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "true").lower() == "true"
+# Cached questions older than this are not reused (and expire from Mongo)
+GENERATION_CACHE_MAX_AGE_HOURS = int(os.getenv("GENERATION_CACHE_MAX_AGE_HOURS", "168"))
+# Never hand the same cached question to a teacher twice
+GENERATION_CACHE_UNIQUE_PER_TEACHER = os.getenv("GENERATION_CACHE_UNIQUE_PER_TEACHER", "true").lower() == "true"
+GENERATION_CACHE_MEMORY_KEYS = int(os.getenv("GENERATION_CACHE_MEMORY_KEYS", "256"))
+GENERATION_CACHE_MEMORY_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_MEMORY_TTL_SECONDS", "300"))
+
+# -------------------------------------------------
+# AUDIO TRANSCRIPTION
+# -------------------------------------------------
+# Long WAV audio is split into overlapping segments transcribed concurrently
+TRANSCRIPTION_SEGMENT_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", "60"))
+TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS", "2"))
+TRANSCRIPTION_SEGMENT_CONCURRENCY = int(os.getenv("TRANSCRIPTION_SEGMENT_CONCURRENCY", "4"))
+# Transcripts are cached by audio SHA-256 and model
+TRANSCRIPTION_CACHE_TTL_DAYS = int(os.getenv("TRANSCRIPTION_CACHE_TTL_DAYS", "30"))
+# WAV is downmixed, resampled, trimmed and normalized before upload
+AUDIO_PREPROCESS_ENABLED = os.getenv("AUDIO_PREPROCESS_ENABLED", "true").lower() == "true"
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+# Frames this far below the loudest one count as silence
+AUDIO_SILENCE_DB = float(os.getenv("AUDIO_SILENCE_DB", "-40"))
+AUDIO_TARGET_DBFS = float(os.getenv("AUDIO_TARGET_DBFS", "-20"))
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "2"))
+
+# -------------------------------------------------
+# BACKGROUND JOBS (AI GENERATION + TRANSCRIPTION)
+# -------------------------------------------------
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# A running job whose lease is not renewed in time is picked up again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RESULT_TTL_DAYS = int(os.getenv("JOB_RESULT_TTL_DAYS", "7"))
+
+# -------------------------------------------------
+# IMAGE PROCESSING
+# -------------------------------------------------
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1600"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "WEBP").upper()  # WEBP | JPEG
+THUMBNAIL_DIMENSION = int(os.getenv("THUMBNAIL_DIMENSION", "320"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
 # -------------------------------------------------
 # AI KEYS
 # -------------------------------------------------
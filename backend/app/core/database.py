@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from app.core.config import MONGO_URL, DB_NAME
+from pymongo.errors import OperationFailure
+from app.core.config import MONGO_URL, DB_NAME, NOTIFICATION_READ_TTL_DAYS
 
 client: AsyncIOMotorClient | None = None
 _db = None
@@ -33,3 +34,74 @@ def get_db():
         raise RuntimeError("❌ Database not initialized. Did you forget connect_db()?")
 
     return _db
+
+
+async def ensure_indexes():
+    db = get_db()
+
+    await db.test_results.create_index([("student_id", 1), ("created_at", -1)])
+    await db.test_results.create_index([("created_at", 1), ("result_id", 1)])
+    await db.student_progress.create_index("student_id", unique=True)
+    await db.blobs.create_index("blob_id", unique=True)
+    await db.notifications.create_index([("user_id", 1), ("created_at", -1)])
+    await db.notifications.create_index("notification_id", unique=True)
+    await db.doubts.create_index("_outbox.next_attempt_at", sparse=True)
+    await db.users.create_index("_outbox.next_attempt_at", sparse=True)
+    await db.notification_counters.create_index("user_id", unique=True)
+
+    ttl_seconds = NOTIFICATION_READ_TTL_DAYS * 24 * 3600
+    try:
+        await db.notifications.create_index(
+            "read_at", name="read_at_ttl", expireAfterSeconds=ttl_seconds
+        )
+    except OperationFailure:
+        # Retention changed since the index was built
+        await db.command(
+            "collMod",
+            "notifications",
+            index={"name": "read_at_ttl", "expireAfterSeconds": ttl_seconds},
+        )
+    await db.broadcasts.create_index([("roles", 1), ("created_at", -1)])
+    await db.broadcasts.create_index([("user_ids", 1), ("created_at", -1)])
+    await db.broadcasts.create_index("broadcast_id", unique=True)
+    await db.doubts.create_index(
+        [("status", 1), ("subject", 1), ("created_at", 1), ("doubt_id", 1)]
+    )
+    # Teachers without subjects page the whole queue in created_at order
+    await db.doubts.create_index([("status", 1), ("created_at", 1), ("doubt_id", 1)])
+    await db.doubts.create_index([("status", 1), ("answered_at", 1)])
+    await db.doubts.create_index([("student_id", 1), ("created_at", -1)])
+    await db.daily_rollups.create_index(
+        [("day", 1), ("paper_id", 1), ("subject", 1), ("exam_type", 1)],
+        unique=True,
+    )
+    await db.question_pool.create_index(
+        [("key", 1), ("fingerprint", 1)], unique=True
+    )
+    await db.question_pool.create_index("expires_at", expireAfterSeconds=0)
+    await db.generation_served.create_index(
+        [("teacher_id", 1), ("key", 1)], unique=True
+    )
+    await db.generation_served.create_index("expires_at", expireAfterSeconds=0)
+    await db.generation_cache_stats.create_index("day", unique=True)
+    await db.generation_quality.create_index([("day", 1), ("model", 1)], unique=True)
+    await db.jobs.create_index("job_id", unique=True)
+    await db.jobs.create_index([("status", 1), ("created_at", 1)])
+    await db.jobs.create_index([("user_id", 1), ("created_at", -1)])
+    await db.jobs.create_index(
+        [("user_id", 1), ("idempotency_key", 1)],
+        unique=True,
+        partialFilterExpression={"idempotency_key": {"$exists": True}},
+    )
+    await db.jobs.create_index("expires_at", expireAfterSeconds=0)
+    await db.generated_papers.create_index(
+        "job_id",
+        unique=True,
+        partialFilterExpression={"job_id": {"$exists": True}},
+    )
+    await db.llm_budgets.create_index("user_id", unique=True)
+    await db.llm_budgets.create_index("expires_at", expireAfterSeconds=0)
+    await db.transcription_cache.create_index([("sha256", 1), ("model", 1)], unique=True)
+    await db.transcription_cache.create_index("expires_at", expireAfterSeconds=0)
+
+    print("✅ MongoDB indexes ensured")
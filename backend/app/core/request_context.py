@@ -0,0 +1,31 @@
+from contextvars import ContextVar
+
+from fastapi import FastAPI
+from starlette.requests import Request
+
+# Origin the current request was addressed to, e.g. "https://api.example.com"
+request_base_url: ContextVar[str] = ContextVar("request_base_url", default="")
+
+
+class RequestBaseURLMiddleware:
+    """
+    Plain ASGI (not BaseHTTPMiddleware) so streaming and SSE responses
+    are passed through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = request_base_url.set(str(Request(scope).base_url).rstrip("/"))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_base_url.reset(token)
+
+
+def setup_request_context(app: FastAPI):
+    app.add_middleware(RequestBaseURLMiddleware)
@@ -23,7 +23,6 @@ def create_token(user_id: str) -> str:
 
 # ---------------- AUTH ----------------
 async def get_current_user(request: Request) -> dict:
-    db = get_db()
     token = request.cookies.get("session_token")
 
     if not token:
@@ -31,6 +30,21 @@ async def get_current_user(request: Request) -> dict:
         if auth_header and auth_header.startswith("Bearer "):
             token = auth_header.split(" ")[1]
 
+    return await _user_from_token(token)
+
+async def get_stream_user(request: Request) -> dict:
+    """
+    Like get_current_user, but also accepts ?token= because browser
+    EventSource cannot send an Authorization header.
+    """
+    token = request.query_params.get("token")
+    if not token:
+        return await get_current_user(request)
+    return await _user_from_token(token)
+
+async def _user_from_token(token: str | None) -> dict:
+    db = get_db()
+
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
@@ -41,7 +55,7 @@ async def get_current_user(request: Request) -> dict:
         if expires_at < datetime.now(timezone.utc):
             raise HTTPException(status_code=401, detail="Session expired")
 
-        user = await db.users.find_one({"user_id": session["user_id"]}, {"_id": 0})
+        user = await db.users.find_one({"user_id": session["user_id"]}, {"_id": 0, "_outbox": 0})
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -49,7 +63,7 @@ async def get_current_user(request: Request) -> dict:
     # JWT based
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0})
+        user = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0, "_outbox": 0})
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
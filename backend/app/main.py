@@ -1,9 +1,11 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+import asyncio
 import logging
 
 from app.core.cors import setup_cors
-from app.core.database import connect_db, close_db
+from app.core.request_context import setup_request_context
+from app.core.database import connect_db, close_db, ensure_indexes
 
 from app.routers import (
     auth,
@@ -16,7 +18,21 @@ from app.routers import (
     seed,
     progress,  
     generated_papers,
+    analytics,
+    blobs,
+    jobs,
 )
+from app.services.analytics_service import rollup_loop
+from app.services.similarity_service import similarity_index_loop
+from app.services.outbox_service import outbox_loop
+from app.services.job_service import job_worker_loop
+from app.services.notification_service import (
+    get_hub,
+    reconcile_loop,
+    compaction_loop,
+)
+from app.utils.images import shutdown_image_pool
+from app.utils.audio import shutdown_audio_pool
 
 # -------------------------------------------------
 # LOGGING
@@ -33,7 +49,27 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     connect_db()          # ✅ runs before first request
+    await ensure_indexes()
+    await get_hub().start()
+
+    background_tasks = [
+        asyncio.create_task(rollup_loop()),
+        asyncio.create_task(similarity_index_loop()),
+        asyncio.create_task(reconcile_loop()),
+        asyncio.create_task(compaction_loop()),
+        asyncio.create_task(outbox_loop()),
+        asyncio.create_task(job_worker_loop()),
+    ]
+
     yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    shutdown_image_pool()
+    shutdown_audio_pool()
+    await get_hub().stop()
+
     close_db()            # ✅ runs on shutdown
 
 # -------------------------------------------------
@@ -48,6 +84,7 @@ app = FastAPI(
 # CORS (BEFORE ROUTERS)
 # -------------------------------------------------
 setup_cors(app)
+setup_request_context(app)
 
 # -------------------------------------------------
 # ROUTERS
@@ -62,6 +99,9 @@ app.include_router(ai.router, prefix="/api")
 app.include_router(seed.router, prefix="/api")
 app.include_router(progress.router, prefix="/api")  # ✅ ADD THIS
 app.include_router(generated_papers.router, prefix="/api") 
+app.include_router(analytics.router, prefix="/api")
+app.include_router(blobs.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
 
 
 
@@ -12,11 +12,15 @@ class Doubt(BaseModel):
     student_name: str
     subject: str
     question_text: str
-    question_image: Optional[str] = None
+    question_image_id: Optional[str] = None  # blob_id in db.blobs
+    question_thumbnail_id: Optional[str] = None
     status: str = "pending"
+    claimed_by: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
 
     answer_text: Optional[str] = None
-    answer_image: Optional[str] = None
+    answer_image_id: Optional[str] = None
+    answer_thumbnail_id: Optional[str] = None
     answered_by: Optional[str] = None
 
     created_at: datetime
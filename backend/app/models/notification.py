@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -7,7 +7,17 @@ class Notification(BaseModel):
     notification_id: str
     user_id: str
     message: str
-    type: str  # doubt_answered | teacher_approved | teacher_revoked
+    type: str  # doubt_answered | teacher_approved | teacher_revoked | broadcast
     is_read: bool = False
     created_at: datetime
     related_id: Optional[str] = None
+
+
+class Broadcast(BaseModel):
+    broadcast_id: str
+    message: str
+    roles: List[str] = []
+    user_ids: List[str] = []
+    created_by: str
+    related_id: Optional[str] = None
+    created_at: datetime
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -28,6 +28,7 @@ class User(UserBase):
     picture: Optional[str] = None
     created_at: datetime
     is_approved: bool = True
+    subjects: Optional[List[str]] = None  # teachers only
 
 
 # ---------- RESPONSE ----------
@@ -1,10 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
-from datetime import datetime, timezone
-import uuid
 
 from app.core.database import get_db
 from app.core.security import get_admin_user
-from app.schemas.auth import TeacherApprovalRequest
+from app.schemas.auth import TeacherApprovalRequest, SubjectsUpdateRequest
+from app.services.auth_service import update_teacher_subjects
+from app.schemas.notification import BroadcastCreateSchema
+from app.services.outbox_service import outbox_entry, outbox_push, notify_dispatcher
+from app.services.progress_service import rebuild_all_progress
+from app.services.notification_service import (
+    notification_payload,
+    create_broadcast,
+    migrate_read_watermarks,
+    compact_notifications,
+)
+from app.services.blob_service import migrate_inline_doubt_images
+from app.services.generation_cache_service import generation_cache_stats
+from app.services.generation_quality_service import generation_quality_stats
+from app.services.llm_service import latency_stats
+from app.services.admission_service import admission_stats
 
 router = APIRouter(
     prefix="/admin",
@@ -22,7 +35,7 @@ async def get_pending_teachers(admin: dict = Depends(get_admin_user)):
     db = get_db()
     teachers = await db.users.find(
         {"role": "teacher", "is_approved": False},
-        {"_id": 0, "password": 0}
+        {"_id": 0, "password": 0, "_outbox": 0}
     ).to_list(100)
 
     return teachers
@@ -39,12 +52,28 @@ async def get_all_teachers(admin: dict = Depends(get_admin_user)):
     db = get_db()
     teachers = await db.users.find(
         {"role": "teacher"},
-        {"_id": 0, "password": 0}
+        {"_id": 0, "password": 0, "_outbox": 0}
     ).to_list(200)
 
     return teachers
 
 
+# -------------------------------------------------
+# SET TEACHER SUBJECTS
+# -------------------------------------------------
+@router.put("/teachers/{user_id}/subjects")
+async def set_teacher_subjects(
+    user_id: str,
+    data: SubjectsUpdateRequest,
+    admin: dict = Depends(get_admin_user)
+):
+    """
+    Route a teacher's doubt queue to these subjects (empty = all).
+    """
+    subjects = await update_teacher_subjects(user_id, data.subjects)
+    return {"user_id": user_id, "subjects": subjects}
+
+
 # -------------------------------------------------
 # APPROVE / DISAPPROVE TEACHER
 # -------------------------------------------------
@@ -57,9 +86,26 @@ async def approve_teacher(
     Approve or revoke a teacher's account.
     """
     db = get_db()
+
+    # -------------------------------------------------
+    # UPDATE + QUEUE NOTIFICATION (ONE ATOMIC WRITE)
+    # -------------------------------------------------
+    notification = outbox_entry("notification", notification_payload(
+        data.user_id,
+        (
+            "Your teacher account has been approved. You can now access the dashboard."
+            if data.approve
+            else "Your teacher account approval has been revoked."
+        ),
+        "teacher_approved" if data.approve else "teacher_revoked",
+    ))
+
     result = await db.users.update_one(
         {"user_id": data.user_id, "role": "teacher"},
-        {"$set": {"is_approved": data.approve}}
+        {
+            "$set": {"is_approved": data.approve},
+            "$push": outbox_push(notification),
+        }
     )
 
     if result.matched_count == 0:
@@ -68,25 +114,131 @@ async def approve_teacher(
             detail="Teacher not found"
         )
 
-    # -------------------------------------------------
-    # CREATE NOTIFICATION
-    # -------------------------------------------------
-    notification_doc = {
-        "notification_id": f"notif_{uuid.uuid4().hex[:12]}",
-        "user_id": data.user_id,
-        "message": (
-            "Your teacher account has been approved. You can now access the dashboard."
-            if data.approve
-            else "Your teacher account approval has been revoked."
-        ),
-        "type": "teacher_approved" if data.approve else "teacher_revoked",
-        "is_read": False,
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "related_id": None,
-    }
-
-    await db.notifications.insert_one(notification_doc)
+    notify_dispatcher()
 
     return {
         "message": f"Teacher {'approved' if data.approve else 'disapproved'} successfully"
     }
+
+
+# -------------------------------------------------
+# REBUILD STUDENT PROGRESS SUMMARIES
+# -------------------------------------------------
+@router.post("/rebuild-progress")
+async def rebuild_progress(admin: dict = Depends(get_admin_user)):
+    """
+    Recompute every student's progress summary from test_results.
+    Run after changing the summary formula.
+    """
+    rebuilt = await rebuild_all_progress()
+
+    return {"message": "Progress summaries rebuilt", "students": rebuilt}
+
+
+# -------------------------------------------------
+# MIGRATE INLINE DOUBT IMAGES TO BLOB STORE
+# -------------------------------------------------
+@router.post("/migrate-doubt-images")
+async def migrate_doubt_images(admin: dict = Depends(get_admin_user)):
+    """
+    Move base64 images embedded in doubts into the blob store.
+    Safe to run multiple times.
+    """
+    migrated = await migrate_inline_doubt_images()
+
+    return {"message": "Doubt images migrated", "doubts": migrated}
+
+
+# -------------------------------------------------
+# MIGRATE NOTIFICATION READ FLAGS TO WATERMARKS
+# -------------------------------------------------
+@router.post("/migrate-notification-watermarks")
+async def migrate_notification_watermarks(admin: dict = Depends(get_admin_user)):
+    """
+    Derive per-user read watermarks from existing is_read flags.
+    Safe to run multiple times.
+    """
+    migrated = await migrate_read_watermarks()
+
+    return {"message": "Notification watermarks migrated", "users": migrated}
+
+
+# -------------------------------------------------
+# BROADCAST ANNOUNCEMENT
+# -------------------------------------------------
+@router.post("/broadcast")
+async def broadcast(
+    data: BroadcastCreateSchema,
+    admin: dict = Depends(get_admin_user)
+):
+    """
+    Announce to every user of the given roles and/or a list of users.
+    """
+    return await create_broadcast(
+        data.message,
+        admin["user_id"],
+        roles=data.roles,
+        user_ids=data.user_ids,
+        related_id=data.related_id,
+    )
+
+
+# -------------------------------------------------
+# COMPACT NOTIFICATIONS
+# -------------------------------------------------
+@router.post("/compact-notifications")
+async def compact_notification_history(admin: dict = Depends(get_admin_user)):
+    """
+    Apply the retention policy now and report collection size before/after.
+    """
+    return await compact_notifications()
+
+
+# -------------------------------------------------
+# AI GENERATION CACHE STATS
+# -------------------------------------------------
+@router.get("/generation-cache")
+async def get_generation_cache_stats(
+    days: int = 7,
+    admin: dict = Depends(get_admin_user)
+):
+    """
+    Daily cache hit rates and estimated model time avoided.
+    """
+    return await generation_cache_stats(days)
+
+
+# -------------------------------------------------
+# AI GENERATION QUALITY
+# -------------------------------------------------
+@router.get("/generation-quality")
+async def get_generation_quality(
+    days: int = 7,
+    admin: dict = Depends(get_admin_user)
+):
+    """
+    Defect rate per model and how many defects regeneration fixed.
+    """
+    return await generation_quality_stats(days)
+
+
+# -------------------------------------------------
+# LLM LATENCY
+# -------------------------------------------------
+@router.get("/llm-latency")
+async def get_llm_latency(admin: dict = Depends(get_admin_user)):
+    """
+    p50/p99 latency, errors and hedging per provider and model (this
+    worker only).
+    """
+    return latency_stats()
+
+
+@router.get("/llm-admission")
+async def get_llm_admission(admin: dict = Depends(get_admin_user)):
+    """
+    Model calls in flight and queued by task, queue wait percentiles and
+    rejections (queue full, timeout, user budget). Concurrency and queue
+    are per worker; budgets are shared.
+    """
+    return admission_stats()
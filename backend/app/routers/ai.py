@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, UploadFile, File
-from app.services.ai_service import generate_paper_ai, transcribe_audio_ai
+from fastapi.responses import StreamingResponse
+from app.services.ai_service import generate_paper_ai, generate_paper_stream, transcribe_audio_ai
 from app.schemas.paper import PaperGenerationRequestSchema
 from app.core.security import get_current_user
 
@@ -13,6 +14,24 @@ async def generate_paper(
     return await generate_paper_ai(request, current_user)
 
 
+@router.post("/generate-paper/stream")
+async def generate_paper_streaming(
+    request:  PaperGenerationRequestSchema,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Server-Sent Events: `question` per question, then `done` or `error`.
+    """
+    return StreamingResponse(
+        generate_paper_stream(request, current_user),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @router.post("/transcribe")
 async def transcribe_audio(
     audio: UploadFile = File(...),
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from app.core.security import get_current_user, get_admin_user
+from app.services.analytics_service import get_cohort_analytics, rebuild_rollups
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"]
+)
+
+# -------------------------------------------------
+# COHORT ANALYTICS (TEACHER / ADMIN)
+# -------------------------------------------------
+@router.get("/cohort")
+async def cohort_analytics(
+    start: str,
+    end: str,
+    group_by: str = "subject",
+    paper_id: Optional[str] = None,
+    subject: Optional[str] = None,
+    exam_type: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Class-wide attempts, mean score and accuracy distribution between two
+    days (YYYY-MM-DD, inclusive), served from precomputed daily rollups.
+    """
+    if current_user.get("role") not in ("teacher", "admin"):
+        raise HTTPException(
+            status_code=403,
+            detail="Only teachers can view cohort analytics"
+        )
+
+    if not current_user.get("is_approved", True):
+        raise HTTPException(
+            status_code=403,
+            detail="Your account is pending approval"
+        )
+
+    return await get_cohort_analytics(
+        start, end, group_by, paper_id, subject, exam_type
+    )
+
+
+# -------------------------------------------------
+# REBUILD ROLLUPS (ADMIN)
+# -------------------------------------------------
+@router.post("/rebuild-rollups")
+async def rebuild_daily_rollups(admin: dict = Depends(get_admin_user)):
+    processed = await rebuild_rollups()
+    return {"message": "Daily rollups rebuilt", "results": processed}
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
 from app.schemas.auth import (
     RegisterRequest,
     LoginRequest,
     AuthResponse,
+    SubjectsUpdateRequest,
 )
 from app.core.security import get_current_user
 from app.services.auth_service import (
@@ -12,6 +13,7 @@ from app.services.auth_service import (
     admin_login,
     process_session_login,
     logout_user,
+    update_teacher_subjects,
 )
 
 router = APIRouter(
@@ -63,9 +65,25 @@ async def me(current_user: dict = Depends(get_current_user)):
         "role": current_user["role"],
         "picture": current_user.get("picture"),
         "is_approved": current_user.get("is_approved", True),
+        "subjects": current_user.get("subjects"),
     }
 
 
+# -------------------------------------------------
+# TEACHER SUBJECTS
+# -------------------------------------------------
+@router.put("/me/subjects")
+async def update_my_subjects(
+    data: SubjectsUpdateRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers have subjects")
+
+    subjects = await update_teacher_subjects(current_user["user_id"], data.subjects)
+    return {"subjects": subjects}
+
+
 # -------------------------------------------------
 # LOGOUT
 # -------------------------------------------------
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.config import BLOB_URL_TTL_SECONDS
+from app.core.security import get_stream_user
+from app.services.blob_service import (
+    get_blob_meta,
+    get_blob_store,
+    parse_range,
+    verify_blob_signature,
+)
+
+router = APIRouter(
+    prefix="/blobs",
+    tags=["Blobs"]
+)
+
+# -------------------------------------------------
+# DOWNLOAD BLOB (RANGE + ETAG)
+# -------------------------------------------------
+@router.get("/{blob_id}")
+async def download_blob(blob_id: str, request: Request):
+    """
+    Stream a stored blob. Needs the signature from blob_url or a logged-in
+    user (header, cookie or ?token=). Blobs are immutable, so the SHA-256
+    doubles as a strong ETag.
+    """
+    params = request.query_params
+    if not verify_blob_signature(blob_id, params.get("expires"), params.get("sig")):
+        await get_stream_user(request)
+
+    meta = await get_blob_meta(blob_id)
+    size = meta["size"]
+    etag = f'"{blob_id}"'
+
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # Private: doubt photos belong to students
+        "Cache-Control": f"private, max-age={BLOB_URL_TTL_SECONDS}, immutable",
+    }
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        byte_range = parse_range(request.headers.get("range"), size)
+
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    return StreamingResponse(
+        get_blob_store().open_range(blob_id, start, end),
+        status_code=206 if byte_range else 200,
+        media_type=meta["content_type"],
+        headers=headers,
+    )
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi import APIRouter, Depends, UploadFile, File, Query
 from typing import Optional
 
 from app.schemas.doubt import (
@@ -7,8 +7,13 @@ from app.schemas.doubt import (
     DoubtResponse,
 )
 from app.core.security import get_current_user
+from app.services.similarity_service import find_similar_doubts
 from app.services.doubt_service import (
     list_doubts,
+    list_doubt_queue,
+    claim_doubts,
+    release_doubt,
+    get_doubt,
     create_doubt,
     answer_doubt,
     upload_doubt_image,
@@ -42,6 +47,68 @@ async def create_doubt_api(
     return await create_doubt(data, current_user)
 
 
+# -------------------------------------------------
+# TEACHER QUEUE
+# -------------------------------------------------
+@router.get("/queue")
+async def get_doubt_queue(
+    status: str = "pending",
+    subject: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+):
+    return await list_doubt_queue(current_user, status, subject, cursor, limit)
+
+
+# -------------------------------------------------
+# SIMILAR ANSWERED DOUBTS (SELF-SERVE)
+# -------------------------------------------------
+@router.get("/similar")
+async def get_similar_doubts(
+    subject: str,
+    q: str,
+    k: int = Query(3, ge=1, le=10),
+    current_user: dict = Depends(get_current_user),
+):
+    return await find_similar_doubts(subject, q, k)
+
+
+# -------------------------------------------------
+# CLAIM NEXT DOUBTS (LEASE)
+# -------------------------------------------------
+@router.post("/claim")
+async def claim_doubts_api(
+    count: int = Query(1, ge=1, le=100),
+    subject: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    return await claim_doubts(current_user, count, subject)
+
+
+# -------------------------------------------------
+# RELEASE LEASE
+# -------------------------------------------------
+@router.post("/{doubt_id}/release")
+async def release_doubt_api(
+    doubt_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    await release_doubt(doubt_id, current_user)
+    return {"message": "Doubt released"}
+
+
+# -------------------------------------------------
+# GET SINGLE DOUBT (DETAIL VIEW)
+# -------------------------------------------------
+@router.get("/{doubt_id}", response_model=DoubtResponse)
+async def get_doubt_api(
+    doubt_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    return await get_doubt(doubt_id, current_user)
+
+
 # -------------------------------------------------
 # ANSWER DOUBT
 # -------------------------------------------------
@@ -63,5 +130,4 @@ async def upload_image_api(
     image: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
 ):
-    image_url = await upload_doubt_image(image)
-    return {"image_url": image_url}
+    return await upload_doubt_image(image)
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, File, Header, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from app.core.security import get_current_user, get_stream_user
+from app.schemas.paper import PaperGenerationRequestSchema
+from app.services.ai_service import submit_generate_paper_job, submit_transcribe_job
+from app.services.job_service import get_job, list_jobs, cancel_job, job_stream
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"]
+)
+
+# -------------------------------------------------
+# SUBMIT PAPER GENERATION
+# -------------------------------------------------
+@router.post("/generate-paper", status_code=202)
+async def submit_generate_paper(
+    request: PaperGenerationRequestSchema,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Queue /generate-paper as a background job and return it immediately.
+    """
+    return await submit_generate_paper_job(request, current_user, idempotency_key)
+
+
+# -------------------------------------------------
+# SUBMIT TRANSCRIPTION
+# -------------------------------------------------
+@router.post("/transcribe", status_code=202)
+async def submit_transcribe(
+    audio: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    return await submit_transcribe_job(audio, current_user, idempotency_key)
+
+
+# -------------------------------------------------
+# LIST MY JOBS
+# -------------------------------------------------
+@router.get("")
+async def get_my_jobs(current_user: dict = Depends(get_current_user)):
+    return await list_jobs(current_user)
+
+
+# -------------------------------------------------
+# JOB STATUS / PROGRESS / RESULT
+# -------------------------------------------------
+@router.get("/{job_id}")
+async def get_job_status(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    return await get_job(job_id, current_user)
+
+
+# -------------------------------------------------
+# LIVE JOB STATUS (SSE)
+# -------------------------------------------------
+@router.get("/{job_id}/events")
+async def stream_job_status(
+    job_id: str,
+    request: Request,
+    current_user: dict = Depends(get_stream_user),
+):
+    """
+    Server-Sent Events: the job state now and on every change, closing
+    once it succeeds, fails or is cancelled.
+    """
+    await get_job(job_id, current_user)
+
+    return StreamingResponse(
+        job_stream(job_id, current_user, request),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+# -------------------------------------------------
+# CANCEL
+# -------------------------------------------------
+@router.post("/{job_id}/cancel")
+async def cancel_my_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    return await cancel_job(job_id, current_user)
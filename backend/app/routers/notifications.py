@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.core.database import get_db
-from app.core.security import get_current_user
+from fastapi import APIRouter, Depends, Header, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from app.core.security import get_current_user, get_stream_user
+from app.services import notification_service
 
 router = APIRouter(
     prefix="/notifications",
@@ -15,17 +18,30 @@ async def list_notifications(current_user: dict = Depends(get_current_user)):
     """
     Get latest notifications for the logged-in user.
     """
-    db = get_db()
-    notifications = await (
-        db.notifications.find(
-            {"user_id": current_user["user_id"]},
-            {"_id": 0}
-        )
-        .sort("created_at", -1)
-        .to_list(50)
-    )
+    return await notification_service.list_notifications(current_user)
 
-    return notifications
+
+# -------------------------------------------------
+# LIVE NOTIFICATION STREAM (SSE)
+# -------------------------------------------------
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    current_user: dict = Depends(get_stream_user),
+):
+    """
+    Server-Sent Events stream of new notifications. Reconnecting clients
+    send Last-Event-ID and receive anything they missed.
+    """
+    return StreamingResponse(
+        notification_service.notification_stream(current_user, request, last_event_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
 
 
 # -------------------------------------------------
@@ -36,11 +52,7 @@ async def get_unread_count(current_user: dict = Depends(get_current_user)):
     """
     Get count of unread notifications.
     """
-    db = get_db()
-    count = await db.notifications.count_documents({
-        "user_id": current_user["user_id"],
-        "is_read": False
-    })
+    count = await notification_service.get_unread_count(current_user)
 
     return {"count": count}
 
@@ -56,20 +68,7 @@ async def mark_notification_read(
     """
     Mark a specific notification as read.
     """
-    db = get_db()
-    result = await db.notifications.update_one(
-        {
-            "notification_id": notification_id,
-            "user_id": current_user["user_id"]
-        },
-        {"$set": {"is_read": True}}
-    )
-
-    if result.matched_count == 0:
-        raise HTTPException(
-            status_code=404,
-            detail="Notification not found"
-        )
+    await notification_service.mark_notification_read(notification_id, current_user)
 
     return {"message": "Notification marked as read"}
 
@@ -82,10 +81,6 @@ async def mark_all_read(current_user: dict = Depends(get_current_user)):
     """
     Mark all notifications as read for the current user.
     """
-    db = get_db()
-    await db.notifications.update_many(
-        {"user_id": current_user["user_id"]},
-        {"$set": {"is_read": True}}
-    )
+    await notification_service.mark_all_read(current_user)
 
     return {"message": "All notifications marked as read"}
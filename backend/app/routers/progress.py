@@ -1,6 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+
 from app.core.security import get_current_user
-from app.services.progress_service import get_student_progress
+from app.services.progress_service import (
+    get_student_progress,
+    get_progress_trend,
+    TREND_RESOLUTIONS,
+    MAX_TREND_POINTS,
+)
 
 router = APIRouter(prefix="/progress", tags=["Progress"])
 
@@ -14,3 +21,32 @@ async def get_progress(current_user: dict = Depends(get_current_user)):
         )
 
     return await get_student_progress(current_user["user_id"])
+
+
+@router.get("/trend")
+async def get_trend(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    resolution: str = "attempt",
+    points: int = Query(30, ge=1, le=MAX_TREND_POINTS),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Downsampled progress trend between `start` (inclusive) and `end`
+    (exclusive) ISO dates at attempt/daily/weekly/monthly resolution.
+    """
+    if current_user.get("role") != "student":
+        raise HTTPException(
+            status_code=403,
+            detail="Only students can view progress"
+        )
+
+    if resolution not in TREND_RESOLUTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"resolution must be one of {list(TREND_RESOLUTIONS)}"
+        )
+
+    return await get_progress_trend(
+        current_user["user_id"], start, end, resolution, points
+    )
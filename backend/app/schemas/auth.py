@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 
 
 # ---------- REQUEST ----------
@@ -8,6 +8,7 @@ class RegisterRequest(BaseModel):
     name: str
     role: str  # student | teacher
     password: str
+    subjects: Optional[List[str]] = None  # teacher doubt routing
 
 
 class LoginRequest(BaseModel):
@@ -15,6 +16,10 @@ class LoginRequest(BaseModel):
     password: str
 
 
+class SubjectsUpdateRequest(BaseModel):
+    subjects: List[str]  # empty -> route every subject to this teacher
+
+
 class TeacherApprovalRequest(BaseModel):
     user_id: str
     approve: bool
@@ -36,4 +41,4 @@ class AuthResponse(BaseModel):
 
 
 class MeResponse(UserResponse):
-    pass
+    subjects: Optional[List[str]] = None
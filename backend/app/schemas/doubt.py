@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 
 # ---------- CREATE ----------
@@ -22,9 +22,14 @@ class DoubtResponse(BaseModel):
     subject: str
     question_text: str
     question_image: Optional[str]
+    question_image_id: Optional[str] = None
+    question_thumbnail: Optional[str] = None
     status: str
     answer_text: Optional[str]
     answer_image: Optional[str]
+    answer_image_id: Optional[str] = None
+    answer_thumbnail: Optional[str] = None
     answered_by: Optional[str]
     created_at: str
     answered_at: Optional[str]
+    similar_doubts: Optional[List[Dict[str, Any]]] = None
@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+# ---------- BROADCAST ----------
+class BroadcastCreateSchema(BaseModel):
+    message: str
+    roles: List[str] = []      # student | teacher
+    user_ids: List[str] = []   # explicit segment
+    related_id: Optional[str] = None
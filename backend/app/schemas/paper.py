@@ -39,6 +39,8 @@ class PaperGenerationRequestSchema(BaseModel):
     class_level: Optional[str] = None
     language: str = "English"
     reference_content: Optional[str] = None
+    # Skip the generation cache and always ask the model
+    fresh: bool = False
 
 
 class SaveGeneratedPaperSchema(BaseModel):
@@ -0,0 +1,200 @@
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+import asyncio
+import heapq
+import itertools
+import time
+
+from app.core.config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+    LLM_BUDGET_WINDOW_SECONDS,
+    LLM_USER_REQUESTS_PER_WINDOW,
+    LLM_USER_TOKENS_PER_WINDOW,
+)
+from app.core.database import get_db
+
+# Lower runs first: students waiting on a transcript go ahead of bulk
+# paper generation
+TASK_PRIORITY = {"transcription": 0, "repair": 1, "generation": 2}
+
+# Rough token estimates, used for budgets before the call is made
+PROMPT_TOKENS = 400
+TOKENS_PER_QUESTION = 250
+AUDIO_BYTES_PER_TOKEN = 1000
+
+
+# -------------------------------------------------
+# CONCURRENCY + PRIORITY QUEUE
+# -------------------------------------------------
+class AdmissionController:
+    """
+    Caps concurrent model calls in this worker. Callers beyond the cap
+    wait in a priority queue (FIFO within a priority) and are rejected
+    when the queue is full or they wait too long.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, timeout_seconds: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self.active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejections: Counter = Counter()
+        self.wait_ms: deque[float] = deque(maxlen=1000)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for *_, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int):
+        started = time.perf_counter()
+
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+        else:
+            if self.queue_depth >= self.max_queue:
+                self.rejections["queue_full"] += 1
+                raise HTTPException(status_code=503, detail="AI service is busy, try again shortly")
+
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), future))
+            try:
+                # The slot is handed over by release(), already counted
+                await asyncio.wait_for(asyncio.shield(future), self.timeout_seconds)
+            except asyncio.TimeoutError:
+                if not future.done():
+                    future.cancel()
+                    self.rejections["timeout"] += 1
+                    raise HTTPException(status_code=503, detail="AI service is busy, try again shortly")
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release()
+                else:
+                    future.cancel()
+                raise
+
+        self.admitted += 1
+        self.wait_ms.append((time.perf_counter() - started) * 1000)
+
+    def release(self):
+        while self._waiters:
+            *_, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        waits = sorted(self.wait_ms)
+
+        def pct(p: float):
+            return round(waits[min(len(waits) - 1, int(p / 100 * len(waits)))], 1) if waits else None
+
+        by_priority = Counter(p for p, _, fut in self._waiters if not fut.done())
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth,
+            "queue_by_priority": {
+                task: by_priority.get(priority, 0) for task, priority in TASK_PRIORITY.items()
+            },
+            "admitted": self.admitted,
+            "wait_p50_ms": pct(50),
+            "wait_p99_ms": pct(99),
+            "rejections": dict(self.rejections),
+        }
+
+
+admission = AdmissionController(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_SECONDS)
+
+
+# -------------------------------------------------
+# PER-USER BUDGETS (SLIDING WINDOW)
+# -------------------------------------------------
+def estimate_generation_tokens(num_questions: int) -> int:
+    return PROMPT_TOKENS + num_questions * TOKENS_PER_QUESTION
+
+
+def estimate_transcription_tokens(audio_bytes: int) -> int:
+    return PROMPT_TOKENS + audio_bytes // AUDIO_BYTES_PER_TOKEN
+
+
+def _charge_pipeline(now: datetime, window: timedelta, tokens: int) -> list:
+    """
+    One atomic update of the user's window document: drop events older
+    than the window, accept if both budgets still have room, and append
+    the event only when accepted.
+    """
+    return [
+        {"$set": {"events": {"$filter": {
+            "input": {"$ifNull": ["$events", []]},
+            "as": "event",
+            "cond": {"$gt": ["$$event.at", now - window]},
+        }}}},
+        {"$set": {"accepted": {"$and": [
+            {"$lt": [{"$size": "$events"}, LLM_USER_REQUESTS_PER_WINDOW]},
+            {"$lte": [{"$add": [{"$sum": "$events.tokens"}, tokens]}, LLM_USER_TOKENS_PER_WINDOW]},
+        ]}}},
+        {"$set": {
+            "events": {"$cond": [
+                "$accepted",
+                {"$concatArrays": ["$events", [{"at": now, "tokens": tokens}]]},
+                "$events",
+            ]},
+            "expires_at": {"$cond": ["$accepted", now + window, "$expires_at"]},
+        }},
+    ]
+
+
+async def charge_llm_budget(user: dict, tokens: int):
+    """
+    Count one request of `tokens` (estimated) against the user's window,
+    or raise 429 with Retry-After when it would exceed either budget.
+    Check and charge are a single conditional update on one document per
+    user, so concurrent requests cannot all slip under the limit. Shared
+    by all workers through Mongo.
+    """
+    if user.get("role") == "admin":
+        return
+
+    now = datetime.now(timezone.utc)
+    window = timedelta(seconds=LLM_BUDGET_WINDOW_SECONDS)
+
+    budget = await get_db().llm_budgets.find_one_and_update(
+        {"user_id": user["user_id"]},
+        _charge_pipeline(now, window, tokens),
+        projection={"_id": 0, "accepted": 1, "events": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    if not budget["accepted"]:
+        admission.rejections["budget"] += 1
+        retry_after = LLM_BUDGET_WINDOW_SECONDS
+        if budget["events"]:
+            oldest = min(e["at"] for e in budget["events"]).replace(tzinfo=timezone.utc)
+            retry_after = max(1, int((oldest + window - now).total_seconds()))
+        raise HTTPException(
+            status_code=429,
+            detail="AI usage limit reached, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def admission_stats() -> dict:
+    return admission.stats()
@@ -1,60 +1,79 @@
 from fastapi import HTTPException, UploadFile
+from contextlib import aclosing
 from datetime import datetime, timezone
-import json
+from pymongo.errors import DuplicateKeyError
 import uuid
-import os
 import logging
-import base64
-
-from openai import AsyncOpenAI
+import asyncio
+import json
+import time
 
+from app.core.config import (
+    GENERATION_CACHE_ENABLED,
+    GENERATION_CHUNK_SIZE,
+    GENERATION_CHUNK_CONCURRENCY,
+    GENERATION_CHUNK_RETRIES,
+)
 from app.core.database import get_db
+from app.utils.json_stream import JsonArrayStreamParser
+from app.utils.llm_json import extract_questions, repair_json
+from app.utils.question_validation import (
+    normalize_question,
+    validate_question,
+    RULE_DESCRIPTIONS,
+)
+from app.utils.sse import sse_event
+from app.utils.text_index import tokenize
+from app.schemas.paper import PaperGenerationRequestSchema
+from app.services.blob_service import store_upload
+from app.services.generation_quality_service import QualityTally, record_generation_quality
+from app.services.job_service import register_job_handler, submit_job
+from app.services.llm_service import llm_complete, llm_stream, route_model
+from app.services.transcription_service import transcribe_upload, transcribe_blob
+from app.services.admission_service import (
+    charge_llm_budget,
+    estimate_generation_tokens,
+)
+from app.services.generation_cache_service import (
+    normalize_generation_params,
+    generation_cache_key,
+    take_cached_questions,
+    add_to_pool,
+    mark_served,
+    record_generation_stats,
+)
 
 logger = logging.getLogger(__name__)
 
 # ======================================================
-# OPENROUTER CONFIG (TEXT + AUDIO)
+# AI PAPER GENERATION
 # ======================================================
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
-
-if not OPENROUTER_API_KEY:
-    raise RuntimeError("OPENROUTER_API_KEY is not configured")
-
-openrouter_client = AsyncOpenAI(
-    api_key=OPENROUTER_API_KEY,
-    base_url=OPENROUTER_BASE_URL,
-    default_headers={
-        "HTTP-Referer": "https://your-app-domain.com",
-        "X-Title": "AI Exam Paper Generator",
-    },
-)
-
-# ======================================================
-# AI PAPER GENERATION (OPENROUTER – GEMINI)
-# ======================================================
-
-async def generate_paper_ai(data, current_user: dict):
-    db = get_db()
-
-    # ---- Permission checks ----
-    if current_user["role"] != "teacher":
-        raise HTTPException(status_code=403, detail="Only teachers can generate papers")
-
-    if not current_user.get("is_approved", True):
-        raise HTTPException(status_code=403, detail="Your account is pending approval")
-
-    # ---- Prompt building ----
+def _build_prompt(
+    data, num_questions: int, part: int = 1, parts: int = 1, avoid: list[str] | None = None
+) -> str:
     exam_context = data.purpose
     if data.sub_type:
         exam_context += f" ({data.sub_type})"
     if data.class_level:
         exam_context += f" for Class {data.class_level}"
 
-    prompt = f"""
-Generate {data.num_questions} multiple choice questions for {exam_context} exam.
+    # Steer concurrent chunks apart so they overlap less
+    spread = (
+        f"\nThis is part {part} of {parts}. Cover different topics from the other parts.\n"
+        if parts > 1 else ""
+    )
+    # Top-up rounds list what the paper already has, so the model does
+    # not hand back the near-duplicates that were just dropped
+    avoid_block = (
+        "\nThe paper already has these questions; do not repeat or paraphrase them:\n"
+        + "\n".join(f"- {stem}" for stem in avoid) + "\n"
+        if avoid else ""
+    )
 
+    return f"""
+Generate {num_questions} multiple choice questions for {exam_context} exam.
+{spread}{avoid_block}
 Subject: {data.subject}
 Difficulty: {data.difficulty}
 Language: {data.language}
@@ -79,54 +98,416 @@ Return ONLY valid JSON in this exact format:
 }}
 """
 
+
+def _build_repair_prompt(data, defects: list[tuple]) -> str:
+    items = "\n\n".join(
+        f"Item {i + 1} problems: "
+        + "; ".join(RULE_DESCRIPTIONS[e] for e in errors)
+        + f"\n{json.dumps(q, ensure_ascii=False)}"
+        for i, (q, errors) in enumerate(defects)
+    )
+
+    return f"""
+These multiple choice questions for a {data.purpose} exam
+(Subject: {data.subject}, Difficulty: {data.difficulty}, Language: {data.language})
+have problems. Return one corrected question per item, in the same order.
+Keep the topic; rewrite the question if it cannot be fixed.
+
+{items}
+
+Every question must have non-empty question_text, exactly four distinct
+options with keys A, B, C and D, and correct_answer set to one of those keys.
+
+Return ONLY valid JSON: {{"questions": [ ... ]}}
+"""
+
+
+def _generation_messages(
+    data, num_questions: int, part: int = 1, parts: int = 1, avoid: list[str] | None = None
+) -> list:
+    return [{"role": "user", "content": _build_prompt(data, num_questions, part, parts, avoid)}]
+
+
+def _has_questions(text: str) -> bool:
+    return bool(extract_questions(text)[0])
+
+
+def _check_question(q, tally: QualityTally) -> tuple[dict, list[str]]:
+    q = normalize_question(q)
+    errors = validate_question(q)
+    tally.check(errors)
+    return q, errors
+
+
+async def _regenerate_defects(data, defects: list[tuple], tally: QualityTally) -> list[dict]:
+    """
+    One batched call that fixes or replaces only the defective items,
+    instead of regenerating their whole chunks.
+    """
+    tally.repair_calls += 1
+    tally.regenerated += len(defects)
+
     try:
-        # ---- OpenRouter call (TEXT GENERATION) ----
-        response = await openrouter_client.chat.completions.create(
-            model="openai/gpt-oss-20b:free",   # ✅ CORRECT & STABLE
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
+        raw_text = await llm_complete(
+            "repair",
+            [{"role": "user", "content": _build_repair_prompt(data, defects)}],
+            temperature=0.3,
+            validate=_has_questions,
         )
+        repaired, _ = extract_questions(raw_text)
+    except Exception as e:
+        logger.warning(f"Regenerating {len(defects)} defective questions failed: {e}")
+        return []
+
+    fixed = []
+    for q in repaired[:len(defects)]:
+        q = normalize_question(q)
+        if not validate_question(q):
+            fixed.append(q)
+
+    tally.fixed += len(fixed)
+    return fixed
+
+
+async def _generate_questions(
+    data, num_questions: int, part: int = 1, parts: int = 1, avoid: list[str] | None = None
+) -> list[dict]:
+    raw_text = await llm_complete(
+        "generation",
+        _generation_messages(data, num_questions, part, parts, avoid),
+        temperature=0.7,
+        validate=_has_questions,
+    )
+
+    # Fenced, chatty or truncated output still yields whatever questions
+    # completed; the chunk runner asks again only for the remainder
+    questions, complete = extract_questions(raw_text)
+    if not questions:
+        logger.error(f"Invalid AI JSON:\n{raw_text}")
+        raise HTTPException(status_code=500, detail="AI returned invalid JSON")
+
+    if not complete:
+        logger.warning(
+            f"Salvaged {len(questions)}/{num_questions} questions from malformed AI output"
+        )
+
+    return questions
+
+
+async def _stream_questions(
+    data, num_questions: int, part: int = 1, parts: int = 1, avoid: list[str] | None = None
+):
+    """
+    Yield each question as soon as its JSON object is complete in the
+    model's streamed output.
+    """
+    parser = JsonArrayStreamParser("questions", repair=repair_json)
+    deltas = llm_stream(
+        "generation", _generation_messages(data, num_questions, part, parts, avoid), temperature=0.7
+    )
+    async with aclosing(deltas):
+        async for delta in deltas:
+            for question in parser.feed(delta):
+                yield question
+            if parser.done:
+                break
+
+
+# ======================================================
+# CHUNKED GENERATION
+# ======================================================
+
+# Top-up prompts list at most this many accepted questions, shortened
+AVOID_STEMS_LIMIT = 40
+AVOID_STEM_CHARS = 120
+
+
+class _Deduper:
+    """
+    Rejects questions whose text is near-identical (token Jaccard) to one
+    already accepted. Papers are at most a few hundred questions, so the
+    pairwise check is cheap.
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self._seen: list[set] = []
+        # Accepted question texts, shortened, for top-up prompts
+        self.stems: list[str] = []
+
+    def add(self, question: dict) -> bool:
+        text = str(question.get("question_text") or "")
+        tokens = set(tokenize(text))
+        for other in self._seen:
+            union = len(tokens | other)
+            if union and len(tokens & other) / union >= self.threshold:
+                return False
+        self._seen.append(tokens)
+        self.stems.append(" ".join(text.split())[:AVOID_STEM_CHARS])
+        return True
+
+
+def _chunk_sizes(num_questions: int) -> list[int]:
+    full, rest = divmod(num_questions, GENERATION_CHUNK_SIZE)
+    return [GENERATION_CHUNK_SIZE] * full + ([rest] if rest else [])
+
+
+async def _generate_chunk(
+    data,
+    size: int,
+    part: int,
+    parts: int,
+    slots: asyncio.Semaphore,
+    out: asyncio.Queue,
+    stream: bool,
+    defects: list,
+    tally: QualityTally,
+    avoid: list[str] | None = None,
+):
+    """
+    Produce `size` questions for one chunk, retrying only this chunk (for
+    whatever it is still short) on failure or a truncated response.
+    Valid questions go to `out`; defective ones are set aside in
+    `defects` for targeted regeneration. Puts None when finished.
+    """
+    produced = 0
+
+    async def accept(q) -> None:
+        nonlocal produced
+        q, errors = _check_question(q, tally)
+        produced += 1
+        if errors:
+            defects.append((q, errors))
+        else:
+            await out.put(q)
+
+    try:
+        for attempt in range(GENERATION_CHUNK_RETRIES + 1):
+            remaining = size - produced
+            try:
+                async with slots:
+                    if stream:
+                        async with aclosing(_stream_questions(data, remaining, part, parts, avoid)) as questions:
+                            async for q in questions:
+                                await accept(q)
+                                if produced == size:
+                                    break
+                    else:
+                        batch = await _generate_questions(data, remaining, part, parts, avoid)
+                        for q in batch[:remaining]:
+                            await accept(q)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Chunk {part}/{parts} attempt {attempt + 1} failed: {e}")
+
+            if produced >= size:
+                return
+
+        logger.error(f"Chunk {part}/{parts} gave up with {produced}/{size} questions")
+    finally:
+        await out.put(None)
+
+
+async def _generate_chunked(data, num_questions: int, deduper: _Deduper, stream: bool = False):
+    """
+    Split the request into chunks, run them with bounded concurrency and
+    yield unique questions as chunks deliver them. Defective questions
+    are then fixed in one batched call, and one top-up round replaces
+    questions dropped as near-duplicates or lost to chunks that gave up.
+    """
+    tally = QualityTally()
+    accepted = 0
+    for round_ in range(2):
+        need = num_questions - accepted
+        if need <= 0:
+            break
 
-        raw_text = response.choices[0].message.content.strip()
+        # Without it the top-up repeats round one's prompts (and answers)
+        avoid = deduper.stems[-AVOID_STEMS_LIMIT:] if round_ else None
+        sizes = _chunk_sizes(need)
+        slots = asyncio.Semaphore(GENERATION_CHUNK_CONCURRENCY)
+        out: asyncio.Queue = asyncio.Queue()
+        defects: list[tuple] = []
+        tasks = [
+            asyncio.create_task(
+                _generate_chunk(
+                    data, size, i + 1, len(sizes), slots, out, stream, defects, tally, avoid
+                )
+            )
+            for i, size in enumerate(sizes)
+        ]
 
         try:
-            parsed = json.loads(raw_text)
-        except json.JSONDecodeError:
-            logger.error(f"Invalid AI JSON:\n{raw_text}")
-            raise HTTPException(status_code=500, detail="AI returned invalid JSON")
-
-        questions = parsed.get("questions", [])
-        if not questions:
-            raise HTTPException(status_code=500, detail="AI returned empty questions")
-
-        # ---- Normalize question IDs ----
-        for i, q in enumerate(questions):
-            q.setdefault("question_id", f"q{i+1}")
-
-        gen_paper_id = f"gen_{uuid.uuid4().hex[:12]}"
-
-        # ---- Save to DB ----
-        await db.generated_papers.insert_one({
-            "gen_paper_id": gen_paper_id,
-            "created_by": current_user["user_id"],
-            "subject": data.subject,
-            "difficulty": data.difficulty,
-            "exam_type": data.purpose,
-            "sub_type": data.sub_type,
-            "class_level": data.class_level,
-            "language": data.language,
-            "questions": questions,
-            "is_published": False,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-        })
-
-        return {
-            "success": True,
-            "gen_paper_id": gen_paper_id,
-            "questions": questions,
-        }
+            finished = 0
+            while finished < len(tasks):
+                q = await out.get()
+                if q is None:
+                    finished += 1
+                elif accepted < num_questions and deduper.add(q):
+                    accepted += 1
+                    yield q
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if defects and accepted < num_questions:
+            for q in await _regenerate_defects(data, defects, tally):
+                if accepted < num_questions and deduper.add(q):
+                    accepted += 1
+                    yield q
+
+        if accepted == 0:
+            # Every chunk failed; a second round would fail the same way
+            break
+
+    await record_generation_quality(route_model("generation"), tally)
+
+
+def _check_can_generate(current_user: dict):
+    if current_user["role"] != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers can generate papers")
+
+    if not current_user.get("is_approved", True):
+        raise HTTPException(status_code=403, detail="Your account is pending approval")
+
+
+async def _take_reusable(data, current_user: dict, cache_key: str) -> list[dict]:
+    if not GENERATION_CACHE_ENABLED or data.fresh:
+        return []
+    return await take_cached_questions(
+        cache_key, current_user["user_id"], data.num_questions
+    )
+
+
+async def _save_generated_paper(
+    data,
+    current_user: dict,
+    params: dict,
+    cache_key: str,
+    reused: list[dict],
+    generated: list[dict],
+    llm_ms: float,
+    time_to_first_question_ms: float | None = None,
+    job_id: str | None = None,
+) -> dict:
+    """
+    Pool new questions, number the final set and persist it to
+    generated_papers (at most once per job).
+    """
+    db = get_db()
+
+    if generated and GENERATION_CACHE_ENABLED:
+        await add_to_pool(cache_key, params, generated)
+
+    # ---- Normalize question IDs ----
+    questions = reused + generated
+    for i, q in enumerate(questions):
+        q["question_id"] = f"q{i+1}"
+
+    if GENERATION_CACHE_ENABLED:
+        await mark_served(cache_key, current_user["user_id"], questions)
+
+    cache_status = "hit" if not generated else ("partial" if reused else "miss")
+    await record_generation_stats(
+        cache_status,
+        data.num_questions,
+        len(reused),
+        llm_ms,
+        len(generated),
+        time_to_first_question_ms,
+    )
+
+    gen_paper_id = f"gen_{uuid.uuid4().hex[:12]}"
+
+    # ---- Save to DB ----
+    paper = {
+        "gen_paper_id": gen_paper_id,
+        "created_by": current_user["user_id"],
+        "subject": data.subject,
+        "difficulty": data.difficulty,
+        "exam_type": data.purpose,
+        "sub_type": data.sub_type,
+        "class_level": data.class_level,
+        "language": data.language,
+        "questions": questions,
+        "cache_status": cache_status,
+        "reused": len(reused),
+        "time_to_first_question_ms": time_to_first_question_ms,
+        "is_published": False,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if job_id:
+        paper["job_id"] = job_id
+
+    try:
+        await db.generated_papers.insert_one(paper)
+    except DuplicateKeyError:
+        # Another run of the same job (its lease expired) saved first
+        return await _paper_for_job(job_id)
+
+    return _paper_response(paper)
+
+
+def _paper_response(paper: dict) -> dict:
+    return {
+        "success": True,
+        "gen_paper_id": paper["gen_paper_id"],
+        "questions": paper["questions"],
+        "cache": {"status": paper["cache_status"], "reused": paper.get("reused", 0)},
+    }
+
+
+async def _paper_for_job(job_id: str) -> dict | None:
+    paper = await get_db().generated_papers.find_one({"job_id": job_id}, {"_id": 0})
+    return _paper_response(paper) if paper else None
+
+
+async def generate_paper_ai(data, current_user: dict, progress=None, job_id: str | None = None):
+    """
+    `progress(done, total)` is awaited as questions arrive when the paper
+    is generated by a background job. A rerun of a job whose paper was
+    already saved returns that paper instead of generating (and charging)
+    again.
+    """
+    _check_can_generate(current_user)
+
+    params = normalize_generation_params(data)
+    cache_key = generation_cache_key(params)
+
+    if job_id:
+        saved = await _paper_for_job(job_id)
+        if saved:
+            return saved
+
+    try:
+        # ---- Reuse pooled questions before calling the model ----
+        reused = await _take_reusable(data, current_user, cache_key)
+
+        generated = []
+        llm_ms = 0.0
+        missing = data.num_questions - len(reused)
+        if missing > 0:
+            await charge_llm_budget(current_user, estimate_generation_tokens(missing))
+            started = time.perf_counter()
+            deduper = _Deduper()
+            for q in reused:
+                deduper.add(q)
+            async with aclosing(_generate_chunked(data, missing, deduper)) as questions:
+                async for q in questions:
+                    generated.append(q)
+                    if progress:
+                        await progress(len(reused) + len(generated), data.num_questions)
+            llm_ms = (time.perf_counter() - started) * 1000
+
+            if not generated:
+                raise HTTPException(status_code=500, detail="AI returned empty questions")
+
+        return await _save_generated_paper(
+            data, current_user, params, cache_key, reused, generated, llm_ms,
+            job_id=job_id,
+        )
 
     except HTTPException:
         raise
@@ -135,41 +516,128 @@ Return ONLY valid JSON in this exact format:
         logger.error(f"Paper generation failed: {e}")
         raise HTTPException(status_code=500, detail="Paper generation failed")
 
+
 # ======================================================
-# AUDIO TRANSCRIPTION (OPENROUTER – MULTIMODAL)
+# STREAMING PAPER GENERATION (SSE)
+# ======================================================
+
+def generate_paper_stream(data, current_user: dict):
+    """
+    SSE variant of generate_paper_ai. Emits one `question` event per
+    question (pooled ones first, then each as the model finishes it) and
+    a final `done` event once the set is saved, or `error`.
+    """
+    _check_can_generate(current_user)
+
+    params = normalize_generation_params(data)
+    cache_key = generation_cache_key(params)
+
+    async def events():
+        started = time.perf_counter()
+        time_to_first_question_ms = None
+        sent = 0
+
+        try:
+            reused = await _take_reusable(data, current_user, cache_key)
+            missing = data.num_questions - len(reused)
+            if missing > 0:
+                # Checked before anything is sent so a rejection is the only event
+                await charge_llm_budget(current_user, estimate_generation_tokens(missing))
+
+            for q in reused:
+                if time_to_first_question_ms is None:
+                    time_to_first_question_ms = (time.perf_counter() - started) * 1000
+                sent += 1
+                yield sse_event("question", {"index": sent, "question": q})
+
+            generated = []
+            llm_ms = 0.0
+            if missing > 0:
+                llm_started = time.perf_counter()
+                deduper = _Deduper()
+                for q in reused:
+                    deduper.add(q)
+                async with aclosing(
+                    _generate_chunked(data, missing, deduper, stream=True)
+                ) as questions:
+                    async for q in questions:
+                        if time_to_first_question_ms is None:
+                            time_to_first_question_ms = (time.perf_counter() - started) * 1000
+                        generated.append(q)
+                        sent += 1
+                        yield sse_event("question", {"index": sent, "question": q})
+                llm_ms = (time.perf_counter() - llm_started) * 1000
+
+            if not reused and not generated:
+                yield sse_event("error", {"detail": "AI returned empty questions"})
+                return
+
+            if time_to_first_question_ms is not None:
+                time_to_first_question_ms = round(time_to_first_question_ms, 1)
+
+            result = await _save_generated_paper(
+                data,
+                current_user,
+                params,
+                cache_key,
+                reused,
+                generated,
+                llm_ms,
+                time_to_first_question_ms,
+            )
+
+            yield sse_event("done", {
+                "gen_paper_id": result["gen_paper_id"],
+                "count": len(result["questions"]),
+                "cache": result["cache"],
+                "time_to_first_question_ms": time_to_first_question_ms,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail, "status": e.status_code})
+
+        except Exception as e:
+            logger.error(f"Streaming paper generation failed: {e}")
+            yield sse_event("error", {"detail": "Paper generation failed"})
+
+    return events()
+
+# ======================================================
+# AUDIO TRANSCRIPTION (MULTIMODAL)
 # ======================================================
 
 async def transcribe_audio_ai(audio: UploadFile, current_user: dict):
-    try:
-        audio_bytes = await audio.read()
-        audio_b64 = base64.b64encode(audio_bytes).decode("utf-8")
-
-        response = await openrouter_client.chat.completions.create(
-            model="google/gemini-2.5-flash-lite",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": "Transcribe this audio accurately into English."},
-                        {
-                            "type": "input_audio",
-                            "input_audio": {
-                                "data": audio_b64,
-                                "format": "wav"
-                            }
-                        }
-                    ],
-                }
-            ],
-        )
+    return await transcribe_upload(audio, current_user)
+
 
-        transcript = response.choices[0].message.content.strip()
+# ======================================================
+# BACKGROUND JOBS
+# ======================================================
 
-        return {
-            "success": True,
-            "text": transcript
-        }
+async def submit_generate_paper_job(data, current_user: dict, idempotency_key: str | None):
+    _check_can_generate(current_user)
+    return await submit_job(
+        "generate_paper", data.model_dump(), current_user, idempotency_key
+    )
 
-    except Exception as e:
-        logger.error(f"Audio transcription failed: {e}")
-        raise HTTPException(status_code=500, detail="Audio transcription failed")
+
+async def submit_transcribe_job(audio: UploadFile, current_user: dict, idempotency_key: str | None):
+    # The job may run on another worker or after a restart, so the audio
+    # goes to the blob store rather than staying in this request
+    meta = await store_upload(audio)
+    return await submit_job(
+        "transcribe", {"blob_id": meta["blob_id"]}, current_user, idempotency_key
+    )
+
+
+@register_job_handler("generate_paper")
+async def run_generate_paper_job(job_id: str, params: dict, user: dict, progress):
+    data = PaperGenerationRequestSchema(**params)
+    await progress(0, data.num_questions)
+    return await generate_paper_ai(data, user, progress, job_id=job_id)
+
+
+@register_job_handler("transcribe")
+async def run_transcribe_job(job_id: str, params: dict, user: dict, progress):
+    return await transcribe_blob(params["blob_id"], user)
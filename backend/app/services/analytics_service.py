@@ -0,0 +1,284 @@
+from fastapi import HTTPException
+from datetime import datetime, timezone, timedelta
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import logging
+import uuid
+
+from app.core.config import ANALYTICS_ROLLUP_INTERVAL_SECONDS
+from app.core.database import get_db
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_JOB_ID = "daily_rollups"
+ROLLUP_BATCH_SIZE = 1000
+# Results newer than this are left for the next run, so a submit that is
+# still in flight cannot land behind the watermark.
+ROLLUP_SAFETY_LAG = timedelta(seconds=5)
+# Only the worker holding the lease folds results; it is renewed per batch
+ROLLUP_LEASE = timedelta(seconds=120)
+
+_worker_id = f"wrk_{uuid.uuid4().hex[:8]}"
+
+ACCURACY_BUCKETS = [f"{lo}-{lo + 10}" for lo in range(0, 100, 10)]
+GROUP_BY_FIELDS = {"day", "paper_id", "subject", "exam_type"}
+
+
+def _accuracy_bucket(accuracy: float) -> str:
+    index = min(int(accuracy // 10), len(ACCURACY_BUCKETS) - 1)
+    return ACCURACY_BUCKETS[max(index, 0)]
+
+
+# -------------------------------------------------
+# INCREMENTAL ROLLUP JOB
+# -------------------------------------------------
+def _rollup_update(result: dict) -> UpdateOne:
+    day = result["created_at"][:10]
+    accuracy = result.get("accuracy", 0)
+
+    return UpdateOne(
+        {
+            "day": day,
+            "paper_id": result.get("paper_id"),
+            "subject": result.get("subject"),
+            "exam_type": result.get("exam_type"),
+        },
+        {
+            "$inc": {
+                "attempts": 1,
+                "score_sum": result.get("score", 0),
+                "accuracy_sum": accuracy,
+                f"accuracy_distribution.{_accuracy_bucket(accuracy)}": 1,
+            },
+            "$set": {
+                "paper_title": result.get("paper_title"),
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            },
+        },
+        upsert=True,
+    )
+
+
+async def _take_rollup_lease() -> dict | None:
+    """
+    Claim the rollup job for this worker. Every worker runs rollup_loop
+    and the $inc updates are not idempotent, so two workers folding the
+    same batch would double-count it. Returns the job state, or None when
+    another worker holds an unexpired lease.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        return await get_db().job_state.find_one_and_update(
+            {
+                "_id": ROLLUP_JOB_ID,
+                "$or": [
+                    {"lease_expires_at": {"$exists": False}},
+                    {"lease_expires_at": {"$lt": now.isoformat()}},
+                    {"worker_id": _worker_id},
+                ],
+            },
+            {"$set": {
+                "worker_id": _worker_id,
+                "lease_expires_at": (now + ROLLUP_LEASE).isoformat(),
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The state document exists and its lease is held elsewhere
+        return None
+
+
+async def _release_rollup_lease():
+    await get_db().job_state.update_one(
+        {"_id": ROLLUP_JOB_ID, "worker_id": _worker_id},
+        {"$unset": {"worker_id": "", "lease_expires_at": ""}}
+    )
+
+
+def _after_watermark(state: dict) -> dict:
+    created_at = state.get("last_created_at", "")
+    result_id = state.get("last_result_id")
+
+    if result_id is None:
+        # State written before result_id paging: nothing at the watermark
+        # time is known to be unprocessed
+        return {"created_at": {"$gt": created_at}}
+
+    return {"$or": [
+        {"created_at": {"$gt": created_at}},
+        {"created_at": created_at, "result_id": {"$gt": result_id}},
+    ]}
+
+
+async def _fold_results(state: dict) -> int:
+    """
+    Fold results after the (created_at, result_id) watermark in batches,
+    advancing the watermark and renewing the lease after each batch.
+    Paging on both fields means results sharing the last created_at of a
+    full batch are not skipped.
+    """
+    db = get_db()
+    cutoff = (datetime.now(timezone.utc) - ROLLUP_SAFETY_LAG).isoformat()
+    processed = 0
+
+    while True:
+        results = await db.test_results.find(
+            {"$and": [_after_watermark(state), {"created_at": {"$lte": cutoff}}]},
+            {
+                "_id": 0,
+                "result_id": 1,
+                "paper_id": 1,
+                "paper_title": 1,
+                "subject": 1,
+                "exam_type": 1,
+                "score": 1,
+                "accuracy": 1,
+                "created_at": 1,
+            }
+        ).sort([("created_at", 1), ("result_id", 1)]).to_list(ROLLUP_BATCH_SIZE)
+
+        if not results:
+            break
+
+        await db.daily_rollups.bulk_write(
+            [_rollup_update(r) for r in results],
+            ordered=False
+        )
+
+        state = {
+            "last_created_at": results[-1]["created_at"],
+            "last_result_id": results[-1].get("result_id", ""),
+        }
+        renewed = await db.job_state.update_one(
+            {"_id": ROLLUP_JOB_ID, "worker_id": _worker_id},
+            {"$set": {
+                **state,
+                "lease_expires_at": (datetime.now(timezone.utc) + ROLLUP_LEASE).isoformat(),
+            }}
+        )
+        processed += len(results)
+
+        if renewed.matched_count == 0:
+            logger.warning("Daily rollup lease lost mid-run; stopping")
+            break
+
+        if len(results) < ROLLUP_BATCH_SIZE:
+            break
+
+    return processed
+
+
+async def run_rollup_job() -> int:
+    """
+    Fold every test result newer than the stored watermark into the
+    daily_rollups collection. Returns the number of results processed
+    (0 when another worker holds the lease).
+    """
+    state = await _take_rollup_lease()
+    if state is None:
+        return 0
+
+    try:
+        return await _fold_results(state)
+    finally:
+        await _release_rollup_lease()
+
+
+async def rebuild_rollups() -> int:
+    db = get_db()
+
+    state = await _take_rollup_lease()
+    if state is None:
+        raise HTTPException(
+            status_code=409,
+            detail="Daily rollup job is running, try again shortly"
+        )
+
+    try:
+        await db.daily_rollups.delete_many({})
+        await db.job_state.update_one(
+            {"_id": ROLLUP_JOB_ID},
+            {"$unset": {"last_created_at": "", "last_result_id": ""}}
+        )
+        return await _fold_results({"last_created_at": "", "last_result_id": ""})
+    finally:
+        await _release_rollup_lease()
+
+
+async def rollup_loop():
+    while True:
+        try:
+            processed = await run_rollup_job()
+            if processed:
+                logger.info(f"Daily rollups updated from {processed} results")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Daily rollup job failed")
+
+        await asyncio.sleep(ANALYTICS_ROLLUP_INTERVAL_SECONDS)
+
+
+# -------------------------------------------------
+# QUERY
+# -------------------------------------------------
+async def get_cohort_analytics(
+    start: str,
+    end: str,
+    group_by: str = "subject",
+    paper_id: str | None = None,
+    subject: str | None = None,
+    exam_type: str | None = None,
+):
+    if group_by not in GROUP_BY_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by must be one of {sorted(GROUP_BY_FIELDS)}"
+        )
+
+    db = get_db()
+    match = {"day": {"$gte": start, "$lte": end}}
+
+    if paper_id:
+        match["paper_id"] = paper_id
+    if subject:
+        match["subject"] = subject
+    if exam_type:
+        match["exam_type"] = exam_type
+
+    group = {
+        "_id": f"${group_by}",
+        "attempts": {"$sum": "$attempts"},
+        "score_sum": {"$sum": "$score_sum"},
+        "accuracy_sum": {"$sum": "$accuracy_sum"},
+    }
+    for bucket in ACCURACY_BUCKETS:
+        group[bucket] = {
+            "$sum": {"$ifNull": [f"$accuracy_distribution.{bucket}", 0]}
+        }
+
+    rows = await db.daily_rollups.aggregate([
+        {"$match": match},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+    ]).to_list(None)
+
+    groups = []
+    for row in rows:
+        attempts = row["attempts"]
+        groups.append({
+            group_by: row["_id"],
+            "attempts": attempts,
+            "mean_score": round(row["score_sum"] / attempts, 2) if attempts else 0,
+            "mean_accuracy": round(row["accuracy_sum"] / attempts, 2) if attempts else 0,
+            "accuracy_distribution": {b: row[b] for b in ACCURACY_BUCKETS},
+        })
+
+    return {
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "groups": groups,
+    }
@@ -33,6 +33,9 @@ async def register_user(data):
         "created_at": datetime.now(timezone.utc).isoformat(),
     }
 
+    if data.role == "teacher" and data.subjects:
+        user_doc["subjects"] = data.subjects
+
     await db.users.insert_one(user_doc)
 
     return {
@@ -48,6 +51,26 @@ async def register_user(data):
     }
 
 
+# -------------------------------------------------
+# TEACHER SUBJECTS (DOUBT ROUTING)
+# -------------------------------------------------
+async def update_teacher_subjects(user_id: str, subjects: list[str]) -> list[str]:
+    """
+    Set the subjects a teacher's doubt queue is filtered to. Teachers
+    registered before routing existed have none and see every subject.
+    """
+    db = get_db()
+    cleaned = list(dict.fromkeys(s.strip() for s in subjects if s.strip()))
+
+    update = {"$set": {"subjects": cleaned}} if cleaned else {"$unset": {"subjects": ""}}
+    result = await db.users.update_one({"user_id": user_id, "role": "teacher"}, update)
+
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Teacher not found")
+
+    return cleaned
+
+
 # -------------------------------------------------
 # LOGIN
 # -------------------------------------------------
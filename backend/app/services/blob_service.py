@@ -0,0 +1,422 @@
+from fastapi import HTTPException, UploadFile
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import re
+import time
+import uuid
+
+import aiofiles
+from gridfs.errors import FileExists
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import (
+    BLOB_STORE,
+    BLOB_DIR,
+    PUBLIC_API_URL,
+    BLOB_URL_TTL_SECONDS,
+    JWT_SECRET,
+)
+from app.core.database import get_db
+from app.core.request_context import request_base_url
+
+CHUNK_SIZE = 1024 * 1024
+MAX_BLOB_BYTES = 25 * 1024 * 1024
+# How long to wait for a concurrent upload of the same bytes to finish
+UPLOAD_SETTLE_SECONDS = 10
+BLOB_URL_RE = re.compile(r"/api/blobs/([0-9a-f]{64})(?:\?.*)?$")
+
+
+# -------------------------------------------------
+# STORAGE BACKENDS
+# -------------------------------------------------
+class BlobStore(ABC):
+    """
+    Byte storage addressed by SHA-256. Metadata lives in db.blobs,
+    whichever backend holds the bytes.
+    """
+
+    @abstractmethod
+    async def put_file(self, blob_id: str, path: str, content_type: str):
+        """
+        Store the file at `path` under `blob_id`. The store takes
+        ownership of `path` and removes it, whatever the outcome.
+        """
+
+    @abstractmethod
+    def open_range(self, blob_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """
+        Bytes `start` to `end` (inclusive), in chunks.
+        """
+
+    @abstractmethod
+    async def delete(self, blob_id: str):
+        """
+        Remove the bytes stored under `blob_id`.
+        """
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, blob_id: str) -> Path:
+        return self.root / blob_id[:2] / blob_id[2:4] / blob_id
+
+    async def put_file(self, blob_id: str, path: str, content_type: str):
+        target = self._path(blob_id)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(path, target)
+        finally:
+            Path(path).unlink(missing_ok=True)
+
+    async def open_range(self, blob_id: str, start: int, end: int):
+        remaining = end - start + 1
+        async with aiofiles.open(self._path(blob_id), "rb") as f:
+            await f.seek(start)
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    async def delete(self, blob_id: str):
+        self._path(blob_id).unlink(missing_ok=True)
+
+
+class GridFSBlobStore(BlobStore):
+    def _bucket(self) -> AsyncIOMotorGridFSBucket:
+        return AsyncIOMotorGridFSBucket(get_db(), bucket_name="blobs")
+
+    async def _upload(self, blob_id: str, path: str, content_type: str):
+        with open(path, "rb") as f:
+            await self._bucket().upload_from_stream_with_id(
+                blob_id,
+                blob_id,
+                f,
+                metadata={"content_type": content_type},
+            )
+
+    async def _wait_for_file(self, blob_id: str) -> bool:
+        deadline = time.monotonic() + UPLOAD_SETTLE_SECONDS
+        while True:
+            if await get_db()["blobs.files"].find_one({"_id": blob_id}, {"_id": 1}):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.2)
+
+    async def put_file(self, blob_id: str, path: str, content_type: str):
+        """
+        Content-addressed, so FileExists means these bytes are (being)
+        stored already: by a concurrent upload, or by one that crashed
+        before recording metadata. Chunks with no file document after the
+        wait are what a crash mid-upload leaves; they are cleared and the
+        upload is retried once.
+        """
+        try:
+            try:
+                await self._upload(blob_id, path, content_type)
+            except FileExists:
+                if await self._wait_for_file(blob_id):
+                    return
+                await get_db()["blobs.chunks"].delete_many({"files_id": blob_id})
+                await self._upload(blob_id, path, content_type)
+        finally:
+            Path(path).unlink(missing_ok=True)
+
+    async def open_range(self, blob_id: str, start: int, end: int):
+        stream = await self._bucket().open_download_stream(blob_id)
+        stream.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await stream.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def delete(self, blob_id: str):
+        await self._bucket().delete(blob_id)
+
+
+_store: BlobStore | None = None
+
+
+def get_blob_store() -> BlobStore:
+    global _store
+
+    if _store is None:
+        _store = GridFSBlobStore() if BLOB_STORE == "gridfs" else LocalBlobStore(BLOB_DIR)
+
+    return _store
+
+
+# -------------------------------------------------
+# SIGNED URLS
+# -------------------------------------------------
+def _blob_signature(blob_id: str, expires: int) -> str:
+    message = f"{blob_id}:{expires}".encode()
+    return hmac.new(JWT_SECRET.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def blob_url(blob_id: str | None) -> str | None:
+    """
+    Absolute, signed URL for a blob. <img> tags cannot send the auth
+    header, so the signature is the permission; it is only handed out
+    by reads that already checked access. Expiry is rounded to the TTL
+    so the URL (and the browser cache) stays stable for a while.
+    """
+    if not blob_id:
+        return None
+
+    expires = (int(time.time()) // BLOB_URL_TTL_SECONDS + 2) * BLOB_URL_TTL_SECONDS
+    base = PUBLIC_API_URL or request_base_url.get()
+    return f"{base}/api/blobs/{blob_id}?expires={expires}&sig={_blob_signature(blob_id, expires)}"
+
+
+def verify_blob_signature(blob_id: str, expires: str | None, sig: str | None) -> bool:
+    if not expires or not sig or not expires.isdigit():
+        return False
+    if int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sig, _blob_signature(blob_id, int(expires)))
+
+
+# -------------------------------------------------
+# WRITE
+# -------------------------------------------------
+
+
+async def _store_spooled(
+    path: str,
+    blob_id: str,
+    size: int,
+    content_type: str,
+    extra: dict | None = None,
+) -> dict:
+    db = get_db()
+
+    meta = await db.blobs.find_one({"blob_id": blob_id}, {"_id": 0})
+    if meta:
+        os.remove(path)
+    else:
+        await get_blob_store().put_file(blob_id, path, content_type)
+
+        # A concurrent upload of the same bytes may have recorded it
+        # first; whichever insert wins, both callers read back one document
+        try:
+            await db.blobs.update_one(
+                {"blob_id": blob_id},
+                {"$setOnInsert": {
+                    "blob_id": blob_id,
+                    "size": size,
+                    "content_type": content_type,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    **(extra or {}),
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass
+        meta = await db.blobs.find_one({"blob_id": blob_id}, {"_id": 0})
+
+    # Same content already stored: dedupe, but fill in metadata the first
+    # writer did not have (e.g. a thumbnail for an image that was
+    # extracted from a data URL)
+    missing = {k: v for k, v in (extra or {}).items() if meta.get(k) is None}
+    if missing:
+        await db.blobs.update_one({"blob_id": blob_id}, {"$set": missing})
+        meta.update(missing)
+    return meta
+
+
+def _spool_path() -> str:
+    spool_dir = Path(BLOB_DIR) / "tmp"
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    return str(spool_dir / uuid.uuid4().hex)
+
+
+async def spool_upload(upload: UploadFile) -> tuple[str, str, int]:
+    """
+    Stream an upload to a spool file while hashing it. Returns
+    (path, sha256, size); the caller owns the file.
+    """
+    path = _spool_path()
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while chunk := await upload.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_BLOB_BYTES:
+                    raise HTTPException(status_code=413, detail="File too large")
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        Path(path).unlink(missing_ok=True)
+        raise
+
+    return path, digest.hexdigest(), size
+
+
+async def store_upload(upload: UploadFile) -> dict:
+    """
+    Spool an upload, then hand it to the configured store unless
+    identical content already exists.
+    """
+    path, blob_id, size = await spool_upload(upload)
+    content_type = upload.content_type or "application/octet-stream"
+    return await _store_spooled(path, blob_id, size, content_type)
+
+
+async def store_bytes(data: bytes, content_type: str, extra: dict | None = None) -> dict:
+    path = _spool_path()
+    async with aiofiles.open(path, "wb") as out:
+        await out.write(data)
+
+    return await _store_spooled(
+        path, hashlib.sha256(data).hexdigest(), len(data), content_type, extra
+    )
+
+
+async def resolve_image_ref(value: str | None) -> str | None:
+    """
+    Turn whatever a client sent as an image (blob URL, blob id or legacy
+    data URL) into a blob id. Inline data is extracted into the store.
+    """
+    if not value:
+        return None
+
+    if value.startswith("data:"):
+        header, _, encoded = value.partition(",")
+        content_type = header[5:].split(";")[0] or "image/png"
+        try:
+            data = base64.b64decode(encoded)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid image data")
+        return (await store_bytes(data, content_type))["blob_id"]
+
+    match = BLOB_URL_RE.search(value)
+    blob_id = match.group(1) if match else value
+
+    if not await get_db().blobs.find_one({"blob_id": blob_id}, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="Unknown image reference")
+
+    return blob_id
+
+
+# -------------------------------------------------
+# READ
+# -------------------------------------------------
+async def get_blob_meta(blob_id: str) -> dict:
+    meta = await get_db().blobs.find_one({"blob_id": blob_id}, {"_id": 0})
+    if not meta:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return meta
+
+
+async def read_blob(blob_id: str) -> bytes:
+    meta = await get_blob_meta(blob_id)
+    chunks = [
+        chunk async for chunk in get_blob_store().open_range(blob_id, 0, meta["size"] - 1)
+    ]
+    return b"".join(chunks)
+
+
+async def spool_blob(blob_id: str) -> str:
+    """
+    Copy a stored blob to a spool file for code that needs a local path.
+    The caller owns the file.
+    """
+    meta = await get_blob_meta(blob_id)
+    path = _spool_path()
+
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            async for chunk in get_blob_store().open_range(blob_id, 0, meta["size"] - 1):
+                await out.write(chunk)
+    except BaseException:
+        Path(path).unlink(missing_ok=True)
+        raise
+
+    return path
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single `bytes=` range. Returns None for a full-body response.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+
+    spec = header[6:].split(",")[0].strip()
+    first, _, last = spec.partition("-")
+
+    try:
+        if first == "":
+            length = int(last)
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+
+    return start, min(end, size - 1)
+
+
+# -------------------------------------------------
+# MIGRATION: INLINE DOUBT IMAGES → BLOBS
+# -------------------------------------------------
+async def migrate_inline_doubt_images() -> int:
+    # The inline copy is deleted once moved, so the target must persist
+    if BLOB_STORE != "gridfs":
+        raise HTTPException(
+            status_code=409,
+            detail="Migration requires BLOB_STORE=gridfs; the local store does not survive restarts"
+        )
+
+    db = get_db()
+    migrated = 0
+
+    cursor = db.doubts.find(
+        {"$or": [
+            {"question_image": {"$regex": "^data:"}},
+            {"answer_image": {"$regex": "^data:"}},
+        ]},
+        {"_id": 0, "doubt_id": 1, "question_image": 1, "answer_image": 1}
+    )
+
+    async for doubt in cursor:
+        update = {}
+        for field in ("question_image", "answer_image"):
+            value = doubt.get(field)
+            if value and value.startswith("data:"):
+                update[f"{field}_id"] = await resolve_image_ref(value)
+                update[field] = None
+
+        await db.doubts.update_one(
+            {"doubt_id": doubt["doubt_id"]},
+            {"$set": update}
+        )
+        migrated += 1
+
+    return migrated
@@ -1,10 +1,74 @@
 from fastapi import HTTPException, UploadFile
-from datetime import datetime, timezone
-import uuid
+from datetime import datetime, timezone, timedelta
+from pymongo import ReturnDocument
+from PIL import Image, UnidentifiedImageError
+from pathlib import Path
 import base64
+import uuid
+import logging
 
+from app.core.config import DOUBT_LEASE_SECONDS
 from app.core.database import get_db
 from app.utils.mongo import serialize_mongo, serialize_mongo_list
+from app.utils.images import process_image
+from app.services.notification_service import notification_payload
+from app.services.outbox_service import outbox_entry, notify_dispatcher
+from app.services.similarity_service import (
+    find_similar_doubts,
+    index_answered_doubt,
+)
+from app.services.blob_service import (
+    blob_url,
+    resolve_image_ref,
+    get_blob_meta,
+    store_bytes,
+    spool_upload,
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUE_PAGE_MAX = 100
+QUEUE_PROJECTION = {
+    "_id": 0,
+    "doubt_id": 1,
+    "student_id": 1,
+    "student_name": 1,
+    "subject": 1,
+    "question_text": 1,
+    "question_thumbnail_id": 1,
+    "status": 1,
+    "claimed_by": 1,
+    "lease_expires_at": 1,
+    "created_at": 1,
+}
+
+
+def with_image_urls(doubt: dict) -> dict:
+    """
+    Expose blob references as URLs under the legacy image fields.
+    Doubts not yet migrated keep their inline image.
+    """
+    for prefix in ("question", "answer"):
+        blob_id = doubt.get(f"{prefix}_image_id")
+        if blob_id:
+            doubt[f"{prefix}_image"] = blob_url(blob_id)
+        else:
+            doubt.setdefault(f"{prefix}_image", None)
+        doubt[f"{prefix}_thumbnail"] = blob_url(doubt.get(f"{prefix}_thumbnail_id"))
+    return doubt
+
+
+async def _image_fields(prefix: str, value: str | None) -> dict:
+    blob_id = await resolve_image_ref(value)
+    thumbnail_id = None
+
+    if blob_id:
+        thumbnail_id = (await get_blob_meta(blob_id)).get("thumbnail_id")
+
+    return {
+        f"{prefix}_image_id": blob_id,
+        f"{prefix}_thumbnail_id": thumbnail_id,
+    }
 
 
 # -------------------------------------------------
@@ -21,12 +85,196 @@ async def list_doubts(user: dict, status: str | None = None):
         query["status"] = status
 
     doubts = (
-        await db.doubts.find(query, {"_id": 0})
+        await db.doubts.find(query, {"_id": 0, "_outbox": 0})
         .sort("created_at", -1)
         .to_list(100)
     )
 
-    return serialize_mongo_list(doubts)
+    return [with_image_urls(d) for d in serialize_mongo_list(doubts)]
+
+
+# -------------------------------------------------
+# TEACHER QUEUE (KEYSET PAGINATION)
+# -------------------------------------------------
+def _encode_cursor(doubt: dict) -> str:
+    raw = f"{doubt['created_at']}|{doubt['doubt_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _lease_available(user_id: str, now: str) -> dict:
+    """
+    Filter for doubts that are unclaimed, whose lease has lapsed, or
+    that this teacher already holds.
+    """
+    return {"$or": [
+        {"lease_expires_at": None},
+        {"lease_expires_at": {"$lte": now}},
+        {"claimed_by": user_id},
+    ]}
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        created_at, doubt_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, doubt_id
+
+
+async def list_doubt_queue(
+    user: dict,
+    status: str = "pending",
+    subject: str | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+):
+    """
+    Oldest-first page of doubts for teachers, without images or answers.
+    Served by the (status, subject, created_at, doubt_id) index, or by
+    (status, created_at, doubt_id) for teachers without subjects.
+    """
+    db = get_db()
+
+    if user["role"] != "teacher":
+        raise HTTPException(
+            status_code=403,
+            detail="Only teachers can view the doubt queue"
+        )
+
+    teacher_subjects = user.get("subjects") or []
+    if subject and teacher_subjects and subject not in teacher_subjects:
+        raise HTTPException(
+            status_code=403,
+            detail="Subject not assigned to you"
+        )
+
+    query = {"status": status}
+    if subject:
+        query["subject"] = subject
+    elif teacher_subjects:
+        query["subject"] = {"$in": teacher_subjects}
+
+    if cursor:
+        created_at, doubt_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "doubt_id": {"$gt": doubt_id}},
+        ]
+
+    limit = max(1, min(limit, QUEUE_PAGE_MAX))
+    doubts = (
+        await db.doubts.find(query, QUEUE_PROJECTION)
+        .sort([("created_at", 1), ("doubt_id", 1)])
+        .to_list(limit + 1)
+    )
+
+    has_more = len(doubts) > limit
+    doubts = doubts[:limit]
+
+    for doubt in doubts:
+        doubt["question_thumbnail"] = blob_url(doubt.pop("question_thumbnail_id", None))
+
+    return {
+        "items": doubts,
+        "next_cursor": _encode_cursor(doubts[-1]) if has_more else None,
+    }
+
+
+# -------------------------------------------------
+# CLAIM / RELEASE (LEASES)
+# -------------------------------------------------
+async def claim_doubts(user: dict, count: int = 1, subject: str | None = None):
+    """
+    Atomically lease up to `count` of the oldest available pending doubts.
+    Expired leases fall back into the pool automatically.
+    """
+    db = get_db()
+
+    if user["role"] != "teacher":
+        raise HTTPException(
+            status_code=403,
+            detail="Only teachers can claim doubts"
+        )
+
+    if not user.get("is_approved", True):
+        raise HTTPException(
+            status_code=403,
+            detail="Your account is pending approval"
+        )
+
+    now = datetime.now(timezone.utc)
+    lease_expires_at = (now + timedelta(seconds=DOUBT_LEASE_SECONDS)).isoformat()
+
+    query = {
+        "status": "pending",
+        "$or": [
+            {"lease_expires_at": None},
+            {"lease_expires_at": {"$lte": now.isoformat()}},
+        ],
+    }
+    teacher_subjects = user.get("subjects") or []
+    if subject:
+        query["subject"] = subject
+    elif teacher_subjects:
+        query["subject"] = {"$in": teacher_subjects}
+
+    claimed = []
+    for _ in range(max(1, min(count, QUEUE_PAGE_MAX))):
+        doubt = await db.doubts.find_one_and_update(
+            query,
+            {"$set": {
+                "claimed_by": user["user_id"],
+                "lease_expires_at": lease_expires_at,
+            }},
+            sort=[("created_at", 1), ("doubt_id", 1)],
+            projection=QUEUE_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if not doubt:
+            break
+
+        doubt["question_thumbnail"] = blob_url(doubt.pop("question_thumbnail_id", None))
+        claimed.append(doubt)
+
+    return {"items": claimed, "lease_expires_at": lease_expires_at}
+
+
+async def release_doubt(doubt_id: str, user: dict):
+    db = get_db()
+
+    result = await db.doubts.update_one(
+        {
+            "doubt_id": doubt_id,
+            "status": "pending",
+            "claimed_by": user["user_id"],
+        },
+        {"$set": {"claimed_by": None, "lease_expires_at": None}}
+    )
+
+    if result.matched_count == 0:
+        raise HTTPException(
+            status_code=409,
+            detail="You do not hold a lease on this doubt"
+        )
+
+
+# -------------------------------------------------
+# GET SINGLE DOUBT
+# -------------------------------------------------
+async def get_doubt(doubt_id: str, user: dict):
+    db = get_db()
+
+    doubt = await db.doubts.find_one({"doubt_id": doubt_id}, {"_id": 0, "_outbox": 0})
+    if not doubt:
+        raise HTTPException(
+            status_code=404,
+            detail="Doubt not found"
+        )
+
+    if user["role"] == "student" and doubt["student_id"] != user["user_id"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return with_image_urls(doubt)
 
 
 # -------------------------------------------------
@@ -47,10 +295,11 @@ async def create_doubt(data, user: dict):
         "student_name": user["name"],
         "subject": data.subject,
         "question_text": data.question_text,
-        "question_image": data.question_image,
+        **(await _image_fields("question", data.question_image)),
         "status": "pending",
         "answer_text": None,
-        "answer_image": None,
+        "answer_image_id": None,
+        "answer_thumbnail_id": None,
         "answered_by": None,
         "created_at": datetime.now(timezone.utc).isoformat(),
         "answered_at": None,
@@ -58,8 +307,13 @@ async def create_doubt(data, user: dict):
 
     await db.doubts.insert_one(doubt_doc)
 
+    response = with_image_urls(serialize_mongo(doubt_doc))
+    response["similar_doubts"] = await find_similar_doubts(
+        data.subject, data.question_text
+    )
+
     # ✅ safe return
-    return serialize_mongo(doubt_doc)
+    return response
 
 
 # -------------------------------------------------
@@ -80,42 +334,122 @@ async def answer_doubt(doubt_id: str, data, user: dict):
             detail="Your account is pending approval"
         )
 
-    doubt = await db.doubts.find_one({"doubt_id": doubt_id})
-    if not doubt:
-        raise HTTPException(
-            status_code=404,
-            detail="Doubt not found"
-        )
-
+    now = datetime.now(timezone.utc).isoformat()
     update_data = {
         "status": "answered",
         "answer_text": data.answer_text,
-        "answer_image": data.answer_image,
+        **(await _image_fields("answer", data.answer_image)),
+        "answer_image": None,
         "answered_by": user["user_id"],
-        "answered_at": datetime.now(timezone.utc).isoformat(),
+        "answered_at": now,
+        "claimed_by": None,
+        "lease_expires_at": None,
     }
 
-    await db.doubts.update_one(
-        {"doubt_id": doubt_id},
-        {"$set": update_data}
+    # Single atomic write: only succeeds while the doubt is pending and
+    # not leased by another teacher. The student's notification rides
+    # along in the doubt's outbox; a pipeline update lets it read
+    # student_id/subject from the matched document.
+    entry = outbox_entry(
+        "notification",
+        notification_payload(None, None, "doubt_answered", doubt_id)
     )
+    entry_expr = {"$mergeObjects": [
+        {"$literal": entry},
+        {"payload": {"$mergeObjects": [
+            {"$literal": entry["payload"]},
+            {
+                "user_id": "$student_id",
+                "message": {"$concat": [
+                    "Your doubt in ", "$subject", " has been answered!"
+                ]},
+            },
+        ]}},
+    ]}
 
-    await db.notifications.insert_one({
-        "notification_id": f"notif_{uuid.uuid4().hex[:12]}",
-        "user_id": doubt["student_id"],
-        "message": f"Your doubt in {doubt['subject']} has been answered!",
-        "type": "doubt_answered",
-        "is_read": False,
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "related_id": doubt_id,
-    })
+    doubt = await db.doubts.find_one_and_update(
+        {
+            "doubt_id": doubt_id,
+            "status": "pending",
+            **_lease_available(user["user_id"], now),
+        },
+        [
+            {"$set": {k: {"$literal": v} for k, v in update_data.items()}},
+            {"$set": {"_outbox": {"$concatArrays": [
+                {"$ifNull": ["$_outbox", []]},
+                [entry_expr],
+            ]}}},
+        ],
+        projection={"_id": 0, "student_id": 1, "subject": 1, "question_text": 1},
+    )
+
+    if not doubt:
+        existing = await db.doubts.find_one(
+            {"doubt_id": doubt_id},
+            {"_id": 0, "status": 1}
+        )
+        if not existing:
+            raise HTTPException(
+                status_code=404,
+                detail="Doubt not found"
+            )
+        if existing["status"] != "pending":
+            raise HTTPException(
+                status_code=409,
+                detail="Doubt has already been answered"
+            )
+        raise HTTPException(
+            status_code=409,
+            detail="Doubt is claimed by another teacher"
+        )
+
+    index_answered_doubt(doubt_id, doubt["subject"], doubt["question_text"])
+
+    notify_dispatcher()
 
 
 # -------------------------------------------------
 # UPLOAD IMAGE
 # -------------------------------------------------
-async def upload_doubt_image(image: UploadFile) -> str:
-    contents = await image.read()
-    encoded = base64.b64encode(contents).decode("utf-8")
-    content_type = image.content_type or "image/png"
-    return f"data:{content_type};base64,{encoded}"
+async def upload_doubt_image(image: UploadFile) -> dict:
+    if image.content_type and not image.content_type.startswith("image/"):
+        raise HTTPException(
+            status_code=400,
+            detail="Only image uploads are allowed"
+        )
+
+    # Streamed to disk; the worker opens the spool file itself
+    path, _, size = await spool_upload(image)
+    try:
+        processed = await process_image(path)
+    except Image.DecompressionBombError:
+        # Small file, huge pixel count: not an OSError
+        raise HTTPException(status_code=413, detail="Image dimensions too large")
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    finally:
+        Path(path).unlink(missing_ok=True)
+
+    thumbnail = await store_bytes(processed["thumbnail"], processed["content_type"])
+    stored = await store_bytes(
+        processed["image"],
+        processed["content_type"],
+        {
+            "thumbnail_id": thumbnail["blob_id"],
+            "original_bytes": size,
+            "width": processed["width"],
+            "height": processed["height"],
+            "processing_ms": processed["processing_ms"],
+        },
+    )
+
+    logger.info(
+        f"Doubt image normalized: {size} -> {len(processed['image'])} bytes "
+        f"(thumbnail {len(processed['thumbnail'])}) in {processed['processing_ms']} ms"
+    )
+
+    return {
+        "image_url": blob_url(stored["blob_id"]),
+        "image_id": stored["blob_id"],
+        "thumbnail_url": blob_url(stored.get("thumbnail_id")),
+    }
@@ -0,0 +1,260 @@
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+import hashlib
+import json
+import random
+import re
+import time
+
+from pymongo import UpdateOne
+
+from app.core.config import (
+    GENERATION_CACHE_MAX_AGE_HOURS,
+    GENERATION_CACHE_UNIQUE_PER_TEACHER,
+    GENERATION_CACHE_MEMORY_KEYS,
+    GENERATION_CACHE_MEMORY_TTL_SECONDS,
+)
+from app.core.database import get_db
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+# -------------------------------------------------
+# KEYS
+# -------------------------------------------------
+def _norm(value: str | None) -> str:
+    return WHITESPACE_RE.sub(" ", (value or "").strip().lower())
+
+
+def normalize_generation_params(data) -> dict:
+    """
+    Everything that changes what the model would produce, except the
+    question count: a pool for a key serves requests of any size.
+    """
+    params = {
+        "subject": _norm(data.subject),
+        "difficulty": _norm(data.difficulty),
+        "purpose": _norm(data.purpose),
+        "sub_type": _norm(data.sub_type),
+        "class_level": _norm(data.class_level),
+        "language": _norm(data.language),
+    }
+    if data.reference_content:
+        params["reference"] = hashlib.sha256(
+            _norm(data.reference_content).encode()
+        ).hexdigest()[:16]
+    return params
+
+
+def generation_cache_key(params: dict) -> str:
+    raw = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def question_fingerprint(question: dict) -> str:
+    options = question.get("options") or {}
+    raw = _norm(question.get("question_text")) + "|" + "|".join(
+        _norm(str(options[k])) for k in sorted(options)
+    )
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+# -------------------------------------------------
+# IN-MEMORY FRONT
+# -------------------------------------------------
+class _PoolCache:
+    """
+    Small LRU of pools per key so repeated requests skip the Mongo read.
+    Entries go stale after GENERATION_CACHE_MEMORY_TTL_SECONDS, which
+    bounds how long another worker's additions stay invisible.
+    """
+
+    def __init__(self, max_keys: int, ttl_seconds: int):
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+
+    def get(self, key: str) -> list[dict] | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, pool: list[dict]):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, pool)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+    def extend(self, key: str, items: list[dict]):
+        pool = self.get(key)
+        if pool is not None:
+            known = {item["fingerprint"] for item in pool}
+            pool.extend(item for item in items if item["fingerprint"] not in known)
+
+
+_memory = _PoolCache(GENERATION_CACHE_MEMORY_KEYS, GENERATION_CACHE_MEMORY_TTL_SECONDS)
+
+
+# -------------------------------------------------
+# READ
+# -------------------------------------------------
+async def _load_pool(key: str) -> list[dict]:
+    pool = _memory.get(key)
+    if pool is not None:
+        return pool
+
+    pool = await get_db().question_pool.find(
+        {"key": key, "fresh_until": {"$gt": datetime.now(timezone.utc).isoformat()}},
+        {"_id": 0, "fingerprint": 1, "question": 1, "fresh_until": 1}
+    ).to_list(None)
+
+    _memory.put(key, pool)
+    return pool
+
+
+async def take_cached_questions(key: str, teacher_id: str, count: int) -> list[dict]:
+    """
+    Sample up to `count` fresh pooled questions, skipping any this teacher
+    has already been given when per-teacher uniqueness is on.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    pool = [item for item in await _load_pool(key) if item["fresh_until"] > now]
+    if not pool:
+        return []
+
+    if GENERATION_CACHE_UNIQUE_PER_TEACHER:
+        served = await get_db().generation_served.find_one(
+            {"teacher_id": teacher_id, "key": key},
+            {"_id": 0, "fingerprints": 1}
+        )
+        seen = set(served["fingerprints"]) if served else set()
+        pool = [item for item in pool if item["fingerprint"] not in seen]
+
+    picked = random.sample(pool, min(count, len(pool)))
+    return [dict(item["question"]) for item in picked]
+
+
+# -------------------------------------------------
+# WRITE
+# -------------------------------------------------
+async def add_to_pool(key: str, params: dict, questions: list[dict]):
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(hours=GENERATION_CACHE_MAX_AGE_HOURS)
+    items = [
+        {
+            "key": key,
+            "fingerprint": question_fingerprint(q),
+            "question": {k: v for k, v in q.items() if k != "question_id"},
+            "params": params,
+            "created_at": now.isoformat(),
+            "fresh_until": expires_at.isoformat(),
+            # BSON date for the TTL index
+            "expires_at": expires_at,
+        }
+        for q in questions
+        if q.get("question_text")
+    ]
+    if not items:
+        return
+
+    await get_db().question_pool.bulk_write(
+        [
+            UpdateOne(
+                {"key": key, "fingerprint": item["fingerprint"]},
+                {"$setOnInsert": item},
+                upsert=True
+            )
+            for item in items
+        ],
+        ordered=False
+    )
+
+    _memory.extend(key, items)
+
+
+async def mark_served(key: str, teacher_id: str, questions: list[dict]):
+    if not GENERATION_CACHE_UNIQUE_PER_TEACHER:
+        return
+
+    now = datetime.now(timezone.utc)
+    await get_db().generation_served.update_one(
+        {"teacher_id": teacher_id, "key": key},
+        {
+            "$addToSet": {"fingerprints": {"$each": [question_fingerprint(q) for q in questions]}},
+            "$set": {"expires_at": now + timedelta(hours=GENERATION_CACHE_MAX_AGE_HOURS)},
+        },
+        upsert=True
+    )
+
+
+# -------------------------------------------------
+# STATS
+# -------------------------------------------------
+async def record_generation_stats(
+    status: str,
+    requested: int,
+    reused: int,
+    llm_ms: float,
+    llm_questions: int,
+    time_to_first_question_ms: float | None = None,
+):
+    """
+    status: "hit" (no model call), "partial" or "miss".
+    time_to_first_question_ms is only known for streamed generations.
+    """
+    inc = {
+        "requests": 1,
+        status: 1,
+        "questions_requested": requested,
+        "questions_reused": reused,
+        "llm_ms": llm_ms,
+        "llm_questions": llm_questions,
+    }
+    if time_to_first_question_ms is not None:
+        inc["streams"] = 1
+        inc["ttfq_ms"] = time_to_first_question_ms
+
+    day = datetime.now(timezone.utc).date().isoformat()
+    await get_db().generation_cache_stats.update_one(
+        {"day": day},
+        {"$inc": inc},
+        upsert=True
+    )
+
+
+async def generation_cache_stats(days: int = 7) -> dict:
+    """
+    Hit rates per day. Avoided latency is estimated from the observed
+    model time per generated question on the same day.
+    """
+    rows = await get_db().generation_cache_stats.find(
+        {}, {"_id": 0}
+    ).sort("day", -1).to_list(days)
+
+    result = []
+    for row in rows:
+        requests = row.get("requests", 0)
+        requested = row.get("questions_requested", 0)
+        reused = row.get("questions_reused", 0)
+        llm_questions = row.get("llm_questions", 0)
+        ms_per_question = row.get("llm_ms", 0) / llm_questions if llm_questions else 0
+
+        result.append({
+            "day": row["day"],
+            "requests": requests,
+            "hits": row.get("hit", 0),
+            "partial": row.get("partial", 0),
+            "misses": row.get("miss", 0),
+            "hit_rate": round(row.get("hit", 0) / requests, 4) if requests else 0,
+            "question_reuse_rate": round(reused / requested, 4) if requested else 0,
+            "avg_llm_ms_per_question": round(ms_per_question, 1),
+            "avoided_llm_ms": round(reused * ms_per_question),
+            "avg_time_to_first_question_ms": (
+                round(row["ttfq_ms"] / row["streams"], 1) if row.get("streams") else None
+            ),
+        })
+
+    return {"days": result}
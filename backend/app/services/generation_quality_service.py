@@ -0,0 +1,66 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+from app.core.database import get_db
+
+
+class QualityTally:
+    """
+    Per-request counts of checked and defective questions, written once
+    when generation finishes.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.defective = 0
+        self.rules: Counter = Counter()
+        self.regenerated = 0
+        self.fixed = 0
+        self.repair_calls = 0
+
+    def check(self, errors: list[str]):
+        self.checked += 1
+        if errors:
+            self.defective += 1
+            self.rules.update(errors)
+
+
+async def record_generation_quality(model: str, tally: QualityTally):
+    if not tally.checked:
+        return
+
+    inc = {
+        "checked": tally.checked,
+        "defective": tally.defective,
+        "regenerated": tally.regenerated,
+        "fixed": tally.fixed,
+        "repair_calls": tally.repair_calls,
+        **{f"rules.{rule}": count for rule, count in tally.rules.items()},
+    }
+    day = datetime.now(timezone.utc).date().isoformat()
+    await get_db().generation_quality.update_one(
+        {"day": day, "model": model},
+        {"$inc": inc},
+        upsert=True
+    )
+
+
+async def generation_quality_stats(days: int = 7) -> dict:
+    """
+    Defect rate per model and day, which rules failed, and how many
+    defective questions the targeted regeneration call fixed.
+    """
+    since = datetime.now(timezone.utc).date().toordinal() - days + 1
+    since_day = datetime.fromordinal(since).date().isoformat()
+
+    rows = await get_db().generation_quality.find(
+        {"day": {"$gte": since_day}}, {"_id": 0}
+    ).sort([("day", -1), ("model", 1)]).to_list(None)
+
+    for row in rows:
+        checked = row.get("checked", 0)
+        regenerated = row.get("regenerated", 0)
+        row["defect_rate"] = round(row.get("defective", 0) / checked, 4) if checked else 0
+        row["fix_rate"] = round(row.get("fixed", 0) / regenerated, 4) if regenerated else None
+
+    return {"days": rows}
@@ -0,0 +1,355 @@
+from fastapi import HTTPException, Request
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import logging
+import uuid
+
+from app.core.config import (
+    JOB_WORKERS,
+    JOB_LEASE_SECONDS,
+    JOB_POLL_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RESULT_TTL_DAYS,
+    SSE_HEARTBEAT_SECONDS,
+)
+from app.core.database import get_db
+from app.services.notification_service import get_hub
+from app.utils.sse import sse_event
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+JOB_PROJECTION = {"_id": 0, "worker_id": 0, "lease_expires_at": 0, "expires_at": 0}
+
+Progress = Callable[[int, int], Awaitable[None]]
+Handler = Callable[[str, dict, dict, Progress], Awaitable[Any]]
+_handlers: dict[str, Handler] = {}
+_wakeup = asyncio.Event()
+_worker_id = f"wrk_{uuid.uuid4().hex[:8]}"
+
+
+def register_job_handler(kind: str):
+    """
+    Handlers receive (job_id, params, user, progress) and return the job
+    result. A job whose worker dies is rerun from the start, so handlers
+    must be safe to repeat; side effects can be keyed on job_id.
+    """
+    def decorator(handler: Handler) -> Handler:
+        _handlers[kind] = handler
+        return handler
+    return decorator
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def _publish(job: dict):
+    await get_hub().publish(f"job:{job['job_id']}", "job", job)
+
+
+# -------------------------------------------------
+# SUBMIT / READ / CANCEL
+# -------------------------------------------------
+async def submit_job(
+    kind: str,
+    params: dict,
+    user: dict,
+    idempotency_key: str | None = None,
+) -> dict:
+    """
+    Queue a job. Resubmitting with the same idempotency key returns the
+    existing job instead of creating another.
+    """
+    db = get_db()
+
+    if idempotency_key:
+        existing = await db.jobs.find_one(
+            {"user_id": user["user_id"], "idempotency_key": idempotency_key},
+            JOB_PROJECTION
+        )
+        if existing:
+            return existing
+
+    now = _now().isoformat()
+    job = {
+        "job_id": f"job_{uuid.uuid4().hex[:12]}",
+        "kind": kind,
+        "user_id": user["user_id"],
+        "params": params,
+        "status": "queued",
+        "progress": {"done": 0, "total": 0},
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "cancel_requested": False,
+        "created_at": now,
+        "updated_at": now,
+    }
+    if idempotency_key:
+        job["idempotency_key"] = idempotency_key
+
+    try:
+        await db.jobs.insert_one(job)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent submit of the same key
+        return await db.jobs.find_one(
+            {"user_id": user["user_id"], "idempotency_key": idempotency_key},
+            JOB_PROJECTION
+        )
+
+    job.pop("_id", None)
+    _wakeup.set()
+    return job
+
+
+async def get_job(job_id: str, user: dict) -> dict:
+    job = await get_db().jobs.find_one({"job_id": job_id}, JOB_PROJECTION)
+    if not job or job["user_id"] != user["user_id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def list_jobs(user: dict, limit: int = 50) -> list:
+    return await get_db().jobs.find(
+        {"user_id": user["user_id"]},
+        {**JOB_PROJECTION, "result": 0, "params": 0}
+    ).sort("created_at", -1).to_list(limit)
+
+
+async def cancel_job(job_id: str, user: dict) -> dict:
+    """
+    Queued jobs are cancelled at once; running ones are flagged and
+    stopped by their worker at its next heartbeat.
+    """
+    db = get_db()
+    await get_job(job_id, user)
+
+    now = _now()
+    job = await db.jobs.find_one_and_update(
+        {"job_id": job_id, "status": "queued"},
+        {"$set": {
+            "status": "cancelled",
+            "updated_at": now.isoformat(),
+            "expires_at": now + timedelta(days=JOB_RESULT_TTL_DAYS),
+        }},
+        projection=JOB_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if job:
+        await _publish(job)
+        return job
+
+    job = await db.jobs.find_one_and_update(
+        {"job_id": job_id, "status": "running"},
+        {"$set": {"cancel_requested": True, "updated_at": now.isoformat()}},
+        projection=JOB_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if job:
+        return job
+
+    raise HTTPException(status_code=409, detail="Job already finished")
+
+
+# -------------------------------------------------
+# WORKERS
+# -------------------------------------------------
+async def _claim_job() -> dict | None:
+    """
+    Take the oldest queued job, or a running one whose worker stopped
+    renewing its lease (crash or restart).
+    """
+    now = _now()
+    return await get_db().jobs.find_one_and_update(
+        {
+            "$or": [
+                {"status": "queued"},
+                {
+                    "status": "running",
+                    "lease_expires_at": {"$lt": now.isoformat()},
+                    "attempts": {"$lt": JOB_MAX_ATTEMPTS},
+                },
+            ],
+        },
+        {
+            "$set": {
+                "status": "running",
+                "worker_id": _worker_id,
+                "lease_expires_at": (now + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat(),
+                "updated_at": now.isoformat(),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _finish(job_id: str, status: str, **fields):
+    now = _now()
+    job = await get_db().jobs.find_one_and_update(
+        {"job_id": job_id, "worker_id": _worker_id, "status": "running"},
+        {"$set": {
+            "status": status,
+            "updated_at": now.isoformat(),
+            "expires_at": now + timedelta(days=JOB_RESULT_TTL_DAYS),
+            **fields,
+        }},
+        projection=JOB_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if job:
+        await _publish(job)
+
+
+async def _run_job(job: dict):
+    db = get_db()
+    job_id = job["job_id"]
+    await _publish({k: v for k, v in job.items() if k not in JOB_PROJECTION})
+
+    async def progress(done: int, total: int):
+        updated = await db.jobs.find_one_and_update(
+            {"job_id": job_id, "worker_id": _worker_id},
+            {"$set": {"progress": {"done": done, "total": total}}},
+            projection=JOB_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated:
+            await _publish(updated)
+
+    handler = _handlers.get(job["kind"])
+    user = await db.users.find_one(
+        {"user_id": job["user_id"]}, {"_id": 0, "password": 0, "_outbox": 0}
+    )
+    if handler is None or user is None:
+        await _finish(job_id, "failed", error="Job cannot be run")
+        return
+
+    task = asyncio.create_task(handler(job_id, job["params"], user, progress))
+
+    # Renew the lease while the handler runs and watch for cancellation
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=JOB_LEASE_SECONDS / 3)
+            if done:
+                break
+
+            state = await db.jobs.find_one_and_update(
+                {"job_id": job_id, "worker_id": _worker_id, "status": "running"},
+                {"$set": {"lease_expires_at": (
+                    _now() + timedelta(seconds=JOB_LEASE_SECONDS)
+                ).isoformat()}},
+                projection={"_id": 0, "cancel_requested": 1},
+            )
+            if state is None or state.get("cancel_requested"):
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                if state is not None:
+                    await _finish(job_id, "cancelled")
+                return
+    finally:
+        # Shutdown: stop the handler; the expired lease hands the job on
+        if not task.done():
+            task.cancel()
+
+    try:
+        result = task.result()
+    except HTTPException as e:
+        await _finish(job_id, "failed", error=e.detail)
+    except Exception:
+        logger.exception(f"Job {job_id} failed")
+        await _finish(job_id, "failed", error="Job failed")
+    else:
+        await _finish(job_id, "succeeded", result=result)
+
+
+async def _expire_abandoned_jobs():
+    """
+    Running jobs whose lease ran out after the last allowed attempt.
+    """
+    now = _now()
+    await get_db().jobs.update_many(
+        {
+            "status": "running",
+            "lease_expires_at": {"$lt": now.isoformat()},
+            "attempts": {"$gte": JOB_MAX_ATTEMPTS},
+        },
+        {"$set": {
+            "status": "failed",
+            "error": "Job abandoned by its worker",
+            "updated_at": now.isoformat(),
+            "expires_at": now + timedelta(days=JOB_RESULT_TTL_DAYS),
+        }}
+    )
+
+
+async def _worker():
+    while True:
+        try:
+            job = await _claim_job()
+            if job is None:
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                _wakeup.clear()
+                continue
+
+            await _run_job(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Job worker iteration failed")
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+
+async def job_worker_loop():
+    workers = [asyncio.create_task(_worker()) for _ in range(JOB_WORKERS)]
+    try:
+        while True:
+            try:
+                await _expire_abandoned_jobs()
+            except Exception:
+                logger.exception("Expiring abandoned jobs failed")
+            await asyncio.sleep(JOB_LEASE_SECONDS)
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+# -------------------------------------------------
+# LIVE JOB STATUS (SSE)
+# -------------------------------------------------
+async def job_stream(job_id: str, user: dict, request: Request):
+    """
+    Yields the current job state, then every update until the job
+    reaches a terminal status.
+    """
+    hub = get_hub()
+    channel = f"job:{job_id}"
+    queue = hub.subscribe(channel)
+
+    try:
+        # Subscribed first so no update between the read and here is lost
+        job = await get_job(job_id, user)
+        yield sse_event("job", job)
+
+        while job["status"] not in TERMINAL_STATUSES:
+            try:
+                message = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+
+            job = message["data"]
+            yield sse_event("job", job)
+    finally:
+        hub.unsubscribe(channel, queue)
@@ -0,0 +1,362 @@
+from fastapi import HTTPException
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import AsyncIterator, Callable
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+
+from openai import AsyncOpenAI
+from contextlib import aclosing
+
+from app.core.config import (
+    OPENROUTER_API_KEY,
+    LLM_GENERATION_MODEL,
+    LLM_GENERATION_PROVIDER,
+    LLM_REPAIR_MODEL,
+    LLM_REPAIR_PROVIDER,
+    LLM_TRANSCRIPTION_MODEL,
+    LLM_TRANSCRIPTION_PROVIDER,
+    LLM_GENERATION_HEDGE_MODEL,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_MOCK_LATENCY_MS,
+)
+from app.services.admission_service import admission, TASK_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+# -------------------------------------------------
+# PROVIDERS
+# -------------------------------------------------
+class LLMProvider(ABC):
+    """
+    Chat-completion backend. Messages use the OpenAI format, including
+    `input_audio` content parts for transcription.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def complete(self, model: str, messages: list, temperature: float) -> str:
+        """
+        The full response text.
+        """
+
+    @abstractmethod
+    def stream(self, model: str, messages: list, temperature: float) -> AsyncIterator[str]:
+        """
+        Text deltas as they arrive (implemented as an async generator).
+        """
+
+
+class OpenRouterProvider(LLMProvider):
+    name = "openrouter"
+
+    def __init__(self, api_key: str | None):
+        self._api_key = api_key
+        self._client: AsyncOpenAI | None = None
+
+    def _get_client(self) -> AsyncOpenAI:
+        # Checked per call, not at import, so the app boots without a key
+        if not self._api_key:
+            raise HTTPException(status_code=503, detail="AI provider is not configured")
+
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=OPENROUTER_BASE_URL,
+                default_headers={
+                    "HTTP-Referer": "https://your-app-domain.com",
+                    "X-Title": "AI Exam Paper Generator",
+                },
+            )
+        return self._client
+
+    async def complete(self, model: str, messages: list, temperature: float) -> str:
+        response = await self._get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    async def stream(self, model: str, messages: list, temperature: float):
+        stream = await self._get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+
+class MockProvider(LLMProvider):
+    """
+    Deterministic offline backend: the same prompt always yields the same
+    answer. Understands the paper, repair and transcription prompts well
+    enough to exercise the whole pipeline without network access.
+    """
+
+    name = "mock"
+
+    COUNT_RE = re.compile(r"Generate (\d+) multiple choice")
+    SUBJECT_RE = re.compile(r"Subject: ([^\n,)]+)")
+    REPAIR_ITEM_RE = re.compile(r"^Item \d+ problems", re.MULTILINE)
+    WORDS = (
+        "force energy cell atom ratio angle current enzyme orbit prism acid lens "
+        "vector matrix gene photon valence torque tissue series limit wave"
+    ).split()
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+
+    @staticmethod
+    def _prompt_text(messages: list) -> str:
+        parts = []
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                parts.append(content)
+            else:
+                for part in content:
+                    if part.get("type") == "text":
+                        parts.append(part["text"])
+                    elif part.get("type") == "input_audio":
+                        parts.append(part["input_audio"]["data"])
+        return "\n".join(parts)
+
+    def _answer(self, model: str, messages: list) -> str:
+        prompt = self._prompt_text(messages)
+        seed = hashlib.sha256(f"{model}\n{prompt}".encode()).hexdigest()
+        rng = random.Random(seed)
+
+        if any(
+            isinstance(m["content"], list)
+            and any(p.get("type") == "input_audio" for p in m["content"])
+            for m in messages
+        ):
+            return f"Mock transcript {seed[:8]}: " + " ".join(rng.choices(self.WORDS, k=12))
+
+        repair_items = len(self.REPAIR_ITEM_RE.findall(prompt))
+        match = self.COUNT_RE.search(prompt)
+        count = repair_items or (int(match.group(1)) if match else 1)
+        subject_match = self.SUBJECT_RE.search(prompt)
+        subject = subject_match.group(1).strip() if subject_match else "General"
+
+        questions = []
+        for i in range(count):
+            words = rng.sample(self.WORDS, 3)
+            options = rng.sample(self.WORDS, 4)
+            questions.append({
+                "question_id": f"q{i + 1}",
+                "question_text": (
+                    f"In {subject}, how does {words[0]} relate to {words[1]} "
+                    f"and {words[2]} ({seed[:6]}-{i})?"
+                ),
+                "options": dict(zip("ABCD", options)),
+                "correct_answer": rng.choice("ABCD"),
+                "explanation": f"Mock explanation for {words[0]}.",
+            })
+        return json.dumps({"questions": questions}, indent=2)
+
+    async def _delay(self, rng: random.Random):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms * rng.uniform(0.5, 1.5) / 1000)
+
+    async def complete(self, model: str, messages: list, temperature: float) -> str:
+        answer = self._answer(model, messages)
+        await self._delay(random.Random(answer))
+        return answer
+
+    async def stream(self, model: str, messages: list, temperature: float):
+        answer = self._answer(model, messages)
+        rng = random.Random(answer)
+        await self._delay(rng)
+        for i in range(0, len(answer), 64):
+            yield answer[i:i + 64]
+            await asyncio.sleep(0)
+
+
+_providers: dict[str, LLMProvider] = {}
+
+
+def get_provider(name: str) -> LLMProvider:
+    if name not in _providers:
+        if name == "mock":
+            _providers[name] = MockProvider(LLM_MOCK_LATENCY_MS)
+        elif name == "openrouter":
+            _providers[name] = OpenRouterProvider(OPENROUTER_API_KEY)
+        else:
+            raise RuntimeError(f"Unknown LLM provider: {name}")
+    return _providers[name]
+
+
+# -------------------------------------------------
+# ROUTING
+# -------------------------------------------------
+# task -> (provider, model, hedge model or None)
+ROUTES = {
+    "generation": (LLM_GENERATION_PROVIDER, LLM_GENERATION_MODEL, LLM_GENERATION_HEDGE_MODEL or None),
+    "repair": (LLM_REPAIR_PROVIDER, LLM_REPAIR_MODEL, LLM_GENERATION_HEDGE_MODEL or None),
+    "transcription": (LLM_TRANSCRIPTION_PROVIDER, LLM_TRANSCRIPTION_MODEL, None),
+}
+
+
+def route_model(task: str) -> str:
+    return ROUTES[task][1]
+
+
+# -------------------------------------------------
+# LATENCY TRACKING
+# -------------------------------------------------
+class LatencyTracker:
+    """
+    Rolling window of call latencies for one provider/model (successful
+    and cancelled calls), plus error and hedge counters. Per process.
+    """
+
+    def __init__(self, window: int = 500):
+        self.samples: deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def percentile(self, p: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+_latency: dict[tuple[str, str], LatencyTracker] = {}
+
+
+def _tracker(provider: str, model: str) -> LatencyTracker:
+    return _latency.setdefault((provider, model), LatencyTracker())
+
+
+def latency_stats() -> list[dict]:
+    return [
+        {
+            "provider": provider,
+            "model": model,
+            "calls": t.calls,
+            "errors": t.errors,
+            "samples": len(t.samples),
+            "p50_ms": round(t.percentile(50), 1) if t.samples else None,
+            "p99_ms": round(t.percentile(99), 1) if t.samples else None,
+            "hedges_fired": t.hedges_fired,
+            "hedges_won": t.hedges_won,
+        }
+        for (provider, model), t in sorted(_latency.items())
+    ]
+
+
+async def _timed_complete(
+    task: str, provider_name: str, model: str, messages: list, temperature: float
+) -> str:
+    # Queue time is admission's concern; latency samples cover the call only
+    async with admission.slot(TASK_PRIORITY[task]):
+        tracker = _tracker(provider_name, model)
+        tracker.calls += 1
+        started = time.perf_counter()
+        try:
+            text = await get_provider(provider_name).complete(model, messages, temperature)
+        except asyncio.CancelledError:
+            # Usually a primary that lost the hedge race. Dropping it would
+            # censor the slow tail and drag the hedge threshold down, so
+            # its elapsed time counts as a (lower-bound) sample.
+            tracker.samples.append((time.perf_counter() - started) * 1000)
+            raise
+        except Exception:
+            tracker.errors += 1
+            raise
+        tracker.samples.append((time.perf_counter() - started) * 1000)
+        return text
+
+
+# -------------------------------------------------
+# PUBLIC API
+# -------------------------------------------------
+async def llm_complete(
+    task: str,
+    messages: list,
+    temperature: float = 0.7,
+    validate: Callable[[str], bool] | None = None,
+) -> str:
+    """
+    Run a completion on the task's route. With a hedge model configured,
+    a backup request is fired once the primary runs past its latency
+    percentile (or returns an invalid answer) and the first valid answer
+    wins.
+    """
+    provider, model, hedge_model = ROUTES[task]
+    validate = validate or (lambda text: bool(text))
+
+    primary_tracker = _tracker(provider, model)
+    threshold = None
+    if hedge_model and len(primary_tracker.samples) >= LLM_HEDGE_MIN_SAMPLES:
+        threshold = primary_tracker.percentile(LLM_HEDGE_PERCENTILE)
+
+    if threshold is None:
+        return await _timed_complete(task, provider, model, messages, temperature)
+
+    primary = asyncio.create_task(_timed_complete(task, provider, model, messages, temperature))
+    backup = None
+
+    # Whatever happens here, including the caller being cancelled while
+    # waiting, no request is left running (and holding an admission slot)
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=threshold / 1000)
+        if done and not primary.exception() and validate(primary.result()):
+            return primary.result()
+
+        primary_tracker.hedges_fired += 1
+        backup = asyncio.create_task(_timed_complete(task, provider, hedge_model, messages, temperature))
+        pending = {backup} if done else {primary, backup}
+        fallback = primary if done else None
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task_ in done:
+                if task_.exception() is None and validate(task_.result()):
+                    if task_ is backup:
+                        primary_tracker.hedges_won += 1
+                    return task_.result()
+                fallback = fallback or task_
+
+        # Neither answer was valid: surface the first one that finished
+        return fallback.result()
+    finally:
+        for task_ in (primary, backup):
+            if task_ is not None and not task_.done():
+                task_.cancel()
+
+
+async def llm_stream(task: str, messages: list, temperature: float = 0.7) -> AsyncIterator[str]:
+    """
+    Stream text deltas from the task's primary route. Not hedged: the
+    caller is already consuming output as it arrives. Holds an admission
+    slot until the stream ends or is closed.
+    """
+    provider, model, _ = ROUTES[task]
+    async with admission.slot(TASK_PRIORITY[task]):
+        _tracker(provider, model).calls += 1
+        async with aclosing(get_provider(provider).stream(model, messages, temperature)) as stream:
+            async for delta in stream:
+                yield delta
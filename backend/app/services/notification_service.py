@@ -0,0 +1,691 @@
+from fastapi import HTTPException, Request
+from datetime import datetime, timezone, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import logging
+import uuid
+
+from app.core.config import (
+    BROADCAST_FANOUT_MAX,
+    EVENT_BROKER,
+    SSE_HEARTBEAT_SECONDS,
+    NOTIFICATION_RECONCILE_SECONDS,
+    NOTIFICATION_READ_TTL_DAYS,
+    NOTIFICATION_MAX_PER_USER,
+    NOTIFICATION_COMPACT_SECONDS,
+)
+from app.core.database import get_db
+from app.services.outbox_service import register_outbox_handler
+from app.utils.pubsub import PubSubHub, InMemoryBroker, MongoCappedBroker
+from app.utils.sse import sse_event
+
+logger = logging.getLogger(__name__)
+
+# read_at is a BSON date kept only for the TTL index
+NOTIFICATION_PROJECTION = {"_id": 0, "read_at": 0}
+# Recent event ids remembered per SSE connection for deduplication
+SSE_SENT_IDS_LIMIT = 500
+
+_hub: PubSubHub | None = None
+
+
+def get_hub() -> PubSubHub:
+    global _hub
+
+    if _hub is None:
+        broker = MongoCappedBroker(get_db) if EVENT_BROKER == "mongo" else InMemoryBroker()
+        _hub = PubSubHub(broker)
+
+    return _hub
+
+
+# -------------------------------------------------
+# CREATE + PUBLISH
+# -------------------------------------------------
+def notification_payload(
+    user_id: str | None,
+    message: str | None,
+    type: str,
+    related_id: str | None = None,
+) -> dict:
+    """
+    Used by:
+    - answer_doubt (via outbox)
+    - approve_teacher (via outbox)
+    """
+    return {
+        "user_id": user_id,
+        "message": message,
+        "type": type,
+        "related_id": related_id,
+    }
+
+
+def _count_unread(user_id: str, created_at: str) -> UpdateOne:
+    """
+    Bump an already seeded counter only. Creating one at 1 would hide the
+    user's older unread notifications from get_unread_count's first-read
+    recount, which includes this new one anyway. A notification the read
+    watermark already covers is not counted either, since nothing could
+    ever decrement it.
+    """
+    return UpdateOne(
+        {
+            "user_id": user_id,
+            "unread": {"$exists": True},
+            "last_read_at": {"$not": {"$gte": created_at}},
+        },
+        {"$inc": {"unread": 1}}
+    )
+
+
+@register_outbox_handler("notification")
+async def deliver_notifications(entries: list[dict]):
+    """
+    Insert, count and publish a batch of notifications. Keyed on the
+    outbox entry id, so redelivery neither duplicates nor double-counts.
+    created_at is the delivery time, not the queue time: a delivery held
+    back by retries must not land behind a mark-all-read watermark.
+    """
+    db = get_db()
+    now = datetime.now(timezone.utc).isoformat()
+
+    docs = [
+        {
+            "notification_id": f"notif_{entry['id'][4:16]}",
+            "is_read": False,
+            **entry["payload"],
+            "created_at": now,
+        }
+        for entry in entries
+    ]
+
+    result = await db.notifications.bulk_write(
+        [
+            UpdateOne(
+                {"notification_id": doc["notification_id"]},
+                {"$setOnInsert": doc},
+                upsert=True
+            )
+            for doc in docs
+        ],
+        ordered=False
+    )
+
+    inserted = [docs[i] for i in result.upserted_ids]
+    if not inserted:
+        return
+
+    await db.notification_counters.bulk_write(
+        [_count_unread(doc["user_id"], doc["created_at"]) for doc in inserted],
+        ordered=False
+    )
+
+    for doc in inserted:
+        doc.pop("_id", None)
+        await get_hub().publish(doc["user_id"], "notification", doc)
+
+
+async def create_notification(
+    user_id: str,
+    message: str,
+    type: str,
+    related_id: str | None = None,
+) -> dict:
+    """
+    Deliver one notification immediately, outside the outbox.
+    """
+    entry = {
+        "id": f"obx_{uuid.uuid4().hex[:16]}",
+        "payload": notification_payload(user_id, message, type, related_id),
+    }
+    await deliver_notifications([entry])
+
+    return await get_db().notifications.find_one(
+        {"notification_id": f"notif_{entry['id'][4:16]}"},
+        NOTIFICATION_PROJECTION
+    )
+
+
+# -------------------------------------------------
+# BROADCASTS
+# -------------------------------------------------
+async def create_broadcast(
+    message: str,
+    created_by: str,
+    roles: list[str] | None = None,
+    user_ids: list[str] | None = None,
+    related_id: str | None = None,
+) -> dict:
+    """
+    Small explicit groups get one notification per user (fan-out on
+    write). Everything else is stored once in db.broadcasts and merged
+    into each recipient's feed at read time.
+    """
+    db = get_db()
+    roles = roles or []
+    user_ids = list(dict.fromkeys(user_ids or []))
+
+    if not roles and not user_ids:
+        raise HTTPException(status_code=400, detail="No broadcast audience given")
+
+    if not roles and len(user_ids) <= BROADCAST_FANOUT_MAX:
+        now = datetime.now(timezone.utc).isoformat()
+        docs = [
+            {
+                "notification_id": f"notif_{uuid.uuid4().hex[:12]}",
+                "user_id": user_id,
+                "message": message,
+                "type": "broadcast",
+                "is_read": False,
+                "created_at": now,
+                "related_id": related_id,
+            }
+            for user_id in user_ids
+        ]
+
+        await db.notifications.insert_many(docs)
+        await db.notification_counters.bulk_write(
+            [_count_unread(u, now) for u in user_ids],
+            ordered=False
+        )
+        for doc in docs:
+            doc.pop("_id", None)
+            await get_hub().publish(doc["user_id"], "notification", doc)
+
+        return {"mode": "fanout", "recipients": len(docs)}
+
+    broadcast_doc = {
+        "broadcast_id": f"bcast_{uuid.uuid4().hex[:12]}",
+        "message": message,
+        "roles": roles,
+        "user_ids": user_ids,
+        "created_by": created_by,
+        "related_id": related_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    await db.broadcasts.insert_one(broadcast_doc)
+    broadcast_doc.pop("_id", None)
+
+    for role in roles:
+        await get_hub().publish(f"role:{role}", "broadcast", broadcast_doc)
+    for user_id in user_ids:
+        await get_hub().publish(user_id, "broadcast", broadcast_doc)
+
+    return {"mode": "broadcast", "broadcast_id": broadcast_doc["broadcast_id"]}
+
+
+def _broadcast_query(user: dict, after: str) -> dict:
+    # Users only see announcements made after they joined
+    after = max(after, user.get("created_at") or "")
+    return {
+        "$or": [{"roles": user.get("role")}, {"user_ids": user["user_id"]}],
+        "created_at": {"$gt": after},
+    }
+
+
+def _broadcast_as_notification(broadcast: dict, user_id: str) -> dict:
+    return {
+        "notification_id": broadcast["broadcast_id"],
+        "user_id": user_id,
+        "message": broadcast["message"],
+        "type": "broadcast",
+        "is_read": False,
+        "created_at": broadcast["created_at"],
+        "related_id": broadcast.get("related_id"),
+    }
+
+
+# -------------------------------------------------
+# LIST / READ STATE
+# -------------------------------------------------
+# A notification is read when its own is_read flag is set or when it was
+# created at or before the user's last_read_at watermark (kept on the
+# notification_counters document), so mark-all-read is one write.
+# Broadcasts read one at a time are remembered in read_broadcast_ids.
+async def get_read_state(user_id: str) -> dict:
+    db = get_db()
+
+    state = await db.notification_counters.find_one(
+        {"user_id": user_id},
+        {"_id": 0, "last_read_at": 1, "read_broadcast_ids": 1}
+    ) or {}
+
+    return {
+        "last_read_at": state.get("last_read_at") or "",
+        "read_broadcast_ids": set(state.get("read_broadcast_ids") or []),
+    }
+
+
+def _apply_read_state(notification: dict, state: dict) -> dict:
+    notification["is_read"] = bool(
+        notification.get("is_read")
+        or notification["created_at"] <= state["last_read_at"]
+        or notification["notification_id"] in state["read_broadcast_ids"]
+    )
+    return notification
+
+
+async def list_notifications(user: dict) -> list:
+    db = get_db()
+    user_id = user["user_id"]
+
+    notifications = await (
+        db.notifications.find(
+            {"user_id": user_id},
+            NOTIFICATION_PROJECTION
+        )
+        .sort("created_at", -1)
+        .to_list(50)
+    )
+
+    broadcasts = await (
+        db.broadcasts.find(_broadcast_query(user, ""), {"_id": 0})
+        .sort("created_at", -1)
+        .to_list(50)
+    )
+
+    merged = notifications + [_broadcast_as_notification(b, user_id) for b in broadcasts]
+    merged.sort(key=lambda n: n["created_at"], reverse=True)
+
+    state = await get_read_state(user_id)
+    return [_apply_read_state(n, state) for n in merged[:50]]
+
+
+async def _unread_broadcast_count(user: dict, state: dict) -> int:
+    db = get_db()
+
+    query = _broadcast_query(user, state["last_read_at"])
+    if state["read_broadcast_ids"]:
+        query["broadcast_id"] = {"$nin": list(state["read_broadcast_ids"])}
+
+    return await db.broadcasts.count_documents(query)
+
+
+async def get_unread_count(user: dict) -> int:
+    """
+    Point read of the materialized counter plus the (few) unread
+    broadcasts. Users without a counter (history written before counters
+    existed) are counted once and seeded.
+    """
+    db = get_db()
+    user_id = user["user_id"]
+    state = await get_read_state(user_id)
+    broadcasts = await _unread_broadcast_count(user, state)
+
+    counter = await db.notification_counters.find_one(
+        {"user_id": user_id},
+        {"_id": 0, "unread": 1}
+    )
+    if counter and "unread" in counter:
+        return max(counter["unread"], 0) + broadcasts
+
+    count = await db.notifications.count_documents({
+        "user_id": user_id,
+        "is_read": False,
+        "created_at": {"$gt": state["last_read_at"]},
+    })
+    try:
+        await db.notification_counters.update_one(
+            {"user_id": user_id, "unread": {"$exists": False}},
+            {"$set": {"unread": count}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # A concurrent first read (another tab) seeded it already
+        counter = await db.notification_counters.find_one(
+            {"user_id": user_id},
+            {"_id": 0, "unread": 1}
+        )
+        count = max((counter or {}).get("unread", count), 0)
+    return count + broadcasts
+
+
+async def _mark_broadcast_read(broadcast_id: str, user: dict):
+    db = get_db()
+
+    broadcast = await db.broadcasts.find_one(
+        {"broadcast_id": broadcast_id, **_broadcast_query(user, "")},
+        {"_id": 1}
+    )
+    if not broadcast:
+        raise HTTPException(
+            status_code=404,
+            detail="Notification not found"
+        )
+
+    await db.notification_counters.update_one(
+        {"user_id": user["user_id"]},
+        {"$addToSet": {"read_broadcast_ids": broadcast_id}},
+        upsert=True
+    )
+
+
+async def mark_notification_read(notification_id: str, user: dict):
+    db = get_db()
+    user_id = user["user_id"]
+
+    if notification_id.startswith("bcast_"):
+        return await _mark_broadcast_read(notification_id, user)
+
+    notification = await db.notifications.find_one_and_update(
+        {"notification_id": notification_id, "user_id": user_id},
+        {"$set": {"is_read": True, "read_at": datetime.now(timezone.utc)}},
+        projection={"_id": 0, "notification_id": 1, "is_read": 1, "created_at": 1},
+    )
+
+    if notification is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Notification not found"
+        )
+
+    # Only the call that actually turned it from unread to read decrements
+    state = await get_read_state(user_id)
+    if not _apply_read_state(notification, state)["is_read"]:
+        await db.notification_counters.update_one(
+            {"user_id": user_id, "unread": {"$gt": 0}},
+            {"$inc": {"unread": -1}}
+        )
+
+
+async def mark_all_read(user: dict):
+    db = get_db()
+
+    await db.notification_counters.update_one(
+        {"user_id": user["user_id"]},
+        {"$set": {
+            "last_read_at": datetime.now(timezone.utc).isoformat(),
+            "unread": 0,
+            "read_broadcast_ids": [],
+        }},
+        upsert=True
+    )
+
+
+# -------------------------------------------------
+# COUNTER RECONCILIATION
+# -------------------------------------------------
+async def reconcile_unread_counters() -> int:
+    """
+    Recount unread notifications per user and fix drifted counters.
+    Returns the number of counters corrected.
+    """
+    db = get_db()
+
+    actual = {
+        row["_id"]: row["unread"]
+        for row in await db.notifications.aggregate([
+            {"$match": {"is_read": False}},
+            {"$lookup": {
+                "from": "notification_counters",
+                "localField": "user_id",
+                "foreignField": "user_id",
+                "as": "state",
+            }},
+            {"$match": {"$expr": {"$gt": [
+                "$created_at",
+                {"$ifNull": [{"$first": "$state.last_read_at"}, ""]},
+            ]}}},
+            {"$group": {"_id": "$user_id", "unread": {"$sum": 1}}},
+        ]).to_list(None)
+    }
+
+    updates = []
+    async for counter in db.notification_counters.find({}, {"_id": 0}):
+        expected = actual.pop(counter["user_id"], 0)
+        if counter.get("unread") != expected:
+            updates.append(UpdateOne(
+                {"user_id": counter["user_id"]},
+                {"$set": {"unread": expected}}
+            ))
+
+    for user_id, unread in actual.items():
+        updates.append(UpdateOne(
+            {"user_id": user_id},
+            {"$set": {"unread": unread}},
+            upsert=True
+        ))
+
+    if updates:
+        await db.notification_counters.bulk_write(updates, ordered=False)
+
+    return len(updates)
+
+
+# -------------------------------------------------
+# MIGRATION: PER-DOCUMENT FLAGS → WATERMARK
+# -------------------------------------------------
+async def migrate_read_watermarks() -> int:
+    """
+    Set each user's watermark to the newest notification that precedes
+    their oldest unread one (or their newest notification when all are
+    read). Existing flags stay valid; later reads only move the watermark.
+    """
+    db = get_db()
+
+    users = await db.notifications.aggregate([
+        {"$group": {
+            "_id": "$user_id",
+            "newest": {"$max": "$created_at"},
+            "oldest_unread": {"$min": {
+                "$cond": [{"$eq": ["$is_read", False]}, "$created_at", None]
+            }},
+        }},
+    ]).to_list(None)
+
+    migrated = 0
+    for user in users:
+        watermark = user["newest"]
+
+        if user["oldest_unread"]:
+            before = await db.notifications.find_one(
+                {"user_id": user["_id"], "created_at": {"$lt": user["oldest_unread"]}},
+                {"_id": 0, "created_at": 1},
+                sort=[("created_at", -1)]
+            )
+            watermark = before["created_at"] if before else None
+
+        if not watermark:
+            continue
+
+        # Never move an existing watermark backwards
+        await db.notification_counters.update_one(
+            {"user_id": user["_id"]},
+            [{"$set": {"last_read_at": {
+                "$max": [{"$ifNull": ["$last_read_at", ""]}, watermark]
+            }}}],
+            upsert=True
+        )
+        migrated += 1
+
+    await reconcile_unread_counters()
+    return migrated
+
+
+async def reconcile_loop():
+    # First pass at boot, so counters created by older code are fixed
+    # before anyone reads them
+    while True:
+        try:
+            fixed = await reconcile_unread_counters()
+            if fixed:
+                logger.info(f"Reconciled {fixed} unread notification counters")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Unread counter reconciliation failed")
+
+        await asyncio.sleep(NOTIFICATION_RECONCILE_SECONDS)
+
+
+# -------------------------------------------------
+# RETENTION
+# -------------------------------------------------
+# Explicitly read notifications expire through the TTL index on read_at
+# (see ensure_indexes). The compactor covers what TTL cannot: items read
+# via the watermark and users above the per-user cap.
+async def notification_collection_stats() -> dict:
+    stats = await get_db().command("collStats", "notifications")
+    return {
+        "count": stats.get("count", 0),
+        "size_bytes": stats.get("size", 0),
+        "storage_bytes": stats.get("storageSize", 0),
+        "index_bytes": stats.get("totalIndexSize", 0),
+    }
+
+
+async def compact_notifications() -> dict:
+    db = get_db()
+    before = await notification_collection_stats()
+    cutoff = (
+        datetime.now(timezone.utc) - timedelta(days=NOTIFICATION_READ_TTL_DAYS)
+    ).isoformat()
+
+    expired = 0
+    async for state in db.notification_counters.find(
+        {"last_read_at": {"$gt": ""}},
+        {"_id": 0, "user_id": 1, "last_read_at": 1}
+    ):
+        result = await db.notifications.delete_many({
+            "user_id": state["user_id"],
+            "created_at": {"$lte": min(state["last_read_at"], cutoff)},
+        })
+        expired += result.deleted_count
+
+    trimmed = 0
+    over_cap = await db.notifications.aggregate([
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": NOTIFICATION_MAX_PER_USER}}},
+    ]).to_list(None)
+
+    for user in over_cap:
+        oldest_kept = await db.notifications.find(
+            {"user_id": user["_id"]},
+            {"_id": 0, "created_at": 1}
+        ).sort("created_at", -1).skip(NOTIFICATION_MAX_PER_USER - 1).limit(1).to_list(1)
+
+        if oldest_kept:
+            result = await db.notifications.delete_many({
+                "user_id": user["_id"],
+                "created_at": {"$lt": oldest_kept[0]["created_at"]},
+            })
+            trimmed += result.deleted_count
+
+    if trimmed:
+        # Capped-away items may have been unread
+        await reconcile_unread_counters()
+
+    after = await notification_collection_stats()
+    metrics = {
+        "expired": expired,
+        "trimmed": trimmed,
+        "before": before,
+        "after": after,
+    }
+    logger.info(f"Notification compaction: {metrics}")
+    return metrics
+
+
+async def compaction_loop():
+    while True:
+        await asyncio.sleep(NOTIFICATION_COMPACT_SECONDS)
+        try:
+            await compact_notifications()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Notification compaction failed")
+
+
+# -------------------------------------------------
+# SSE STREAM
+# -------------------------------------------------
+async def _missed_notifications(user: dict, last_event_id: str) -> list:
+    db = get_db()
+    user_id = user["user_id"]
+
+    last = await db.notifications.find_one(
+        {"notification_id": last_event_id, "user_id": user_id},
+        {"_id": 0, "created_at": 1}
+    ) or await db.broadcasts.find_one(
+        {"broadcast_id": last_event_id},
+        {"_id": 0, "created_at": 1}
+    )
+    if not last:
+        return []
+
+    notifications = await db.notifications.find(
+        {"user_id": user_id, "created_at": {"$gt": last["created_at"]}},
+        NOTIFICATION_PROJECTION
+    ).sort("created_at", 1).to_list(100)
+
+    broadcasts = await db.broadcasts.find(
+        _broadcast_query(user, last["created_at"]),
+        {"_id": 0}
+    ).sort("created_at", 1).to_list(100)
+
+    missed = notifications + [_broadcast_as_notification(b, user_id) for b in broadcasts]
+    missed.sort(key=lambda n: n["created_at"])
+    return missed
+
+
+async def notification_stream(user: dict, request: Request, last_event_id: str | None):
+    """
+    Yields SSE frames: notifications missed since Last-Event-ID, then live
+    events, with comment heartbeats to keep proxies from closing the
+    connection.
+    """
+    hub = get_hub()
+    user_id = user["user_id"]
+    channels = [user_id, f"role:{user.get('role')}"]
+
+    queue = hub.subscribe(channels[0])
+    hub.subscribe(channels[1], queue)
+
+    try:
+        yield f"retry: {SSE_HEARTBEAT_SECONDS * 1000}\n\n"
+
+        # Subscribed before replaying, so anything published meanwhile is
+        # queued; skip those already sent by the replay. A broadcast aimed
+        # at both the user and their role arrives once per channel, so
+        # live events are deduped the same way (insertion-ordered, capped).
+        sent: dict[str, None] = {}
+
+        def first_time(notification_id: str | None) -> bool:
+            if notification_id is None:
+                return True
+            if notification_id in sent:
+                return False
+            sent[notification_id] = None
+            if len(sent) > SSE_SENT_IDS_LIMIT:
+                del sent[next(iter(sent))]
+            return True
+
+        if last_event_id:
+            for notification in await _missed_notifications(user, last_event_id):
+                first_time(notification["notification_id"])
+                yield sse_event("notification", notification, notification["notification_id"])
+
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+
+            data = message["data"]
+            if message["event"] == "broadcast":
+                if data.get("created_at", "") <= (user.get("created_at") or ""):
+                    continue
+                data = _broadcast_as_notification(data, user_id)
+
+            if not first_time(data.get("notification_id")):
+                continue
+            yield sse_event("notification", data, data.get("notification_id"))
+    finally:
+        for channel in channels:
+            hub.unsubscribe(channel, queue)
@@ -0,0 +1,175 @@
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable
+from pymongo import UpdateOne
+import asyncio
+import logging
+import uuid
+
+from app.core.config import OUTBOX_POLL_SECONDS, OUTBOX_MAX_ATTEMPTS
+from app.core.database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Collections whose documents may carry pending side effects in `_outbox`.
+# Each effect is pushed in the same update as the primary write, so the
+# two can never diverge, and is delivered later by the dispatcher.
+OUTBOX_SOURCES = ("doubts", "users")
+OUTBOX_BATCH_SIZE = 200
+
+Handler = Callable[[list[dict]], Awaitable[None]]
+_handlers: dict[str, Handler] = {}
+_wakeup = asyncio.Event()
+
+
+def register_outbox_handler(kind: str):
+    """
+    Handlers receive a batch of entries ({"id", "payload"}) and must be
+    idempotent on entry id: a crash after delivery redelivers the batch.
+    """
+    def decorator(handler: Handler) -> Handler:
+        _handlers[kind] = handler
+        return handler
+    return decorator
+
+
+# -------------------------------------------------
+# ENQUEUE (PART OF THE PRIMARY WRITE)
+# -------------------------------------------------
+def outbox_entry(kind: str, payload: dict) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "id": f"obx_{uuid.uuid4().hex[:16]}",
+        "kind": kind,
+        "payload": payload,
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+    }
+
+
+def outbox_push(*entries: dict) -> dict:
+    """
+    `$push` clause to merge into the primary update.
+    """
+    return {"_outbox": {"$each": list(entries)}}
+
+
+def notify_dispatcher():
+    _wakeup.set()
+
+
+# -------------------------------------------------
+# DISPATCH
+# -------------------------------------------------
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(2 ** attempts, 300))
+
+
+async def _deliver(kind: str, items: list[tuple]) -> tuple[list[tuple], list[tuple]]:
+    """
+    Hand `items` to the kind's handler as one batch. If the batch fails,
+    retry the entries one by one (handlers are idempotent), so only the
+    entries that fail on their own back off. Returns (delivered, failed).
+    """
+    handler = _handlers.get(kind)
+    if handler is None:
+        logger.error(f"No outbox handler for {kind}")
+        return [], items
+
+    try:
+        await handler([{"id": e["id"], "payload": e["payload"]} for _, e in items])
+        return items, []
+    except Exception:
+        if len(items) == 1:
+            logger.exception(f"Outbox delivery failed for a {kind} entry")
+            return [], items
+        logger.exception(f"Outbox batch of {len(items)} {kind} entries failed, retrying one by one")
+
+    delivered, failed = [], []
+    for item in items:
+        _, entry = item
+        try:
+            await handler([{"id": entry["id"], "payload": entry["payload"]}])
+            delivered.append(item)
+        except Exception:
+            logger.exception(f"Outbox delivery failed for {kind} entry {entry['id']}")
+            failed.append(item)
+    return delivered, failed
+
+
+async def _dispatch_source(source: str) -> int:
+    db = get_db()
+    coll = db[source]
+    now = datetime.now(timezone.utc)
+    now_iso = now.isoformat()
+
+    docs = await coll.find(
+        {"_outbox.next_attempt_at": {"$lte": now_iso}},
+        {"_id": 1, "_outbox": 1}
+    ).limit(OUTBOX_BATCH_SIZE).to_list(OUTBOX_BATCH_SIZE)
+
+    by_kind: dict[str, list[tuple]] = {}
+    for doc in docs:
+        for entry in doc.get("_outbox", []):
+            if entry["next_attempt_at"] <= now_iso:
+                by_kind.setdefault(entry["kind"], []).append((doc["_id"], entry))
+
+    updates = []
+    dead = []
+    for kind, items in by_kind.items():
+        delivered, failed = await _deliver(kind, items)
+
+        for doc_id, entry in failed:
+            attempts = entry["attempts"] + 1
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                dead.append({**entry, "source": source, "attempts": attempts})
+                updates.append(UpdateOne(
+                    {"_id": doc_id},
+                    {"$pull": {"_outbox": {"id": entry["id"]}}}
+                ))
+            else:
+                updates.append(UpdateOne(
+                    {"_id": doc_id},
+                    {"$set": {
+                        "_outbox.$[e].attempts": attempts,
+                        "_outbox.$[e].next_attempt_at": (now + _backoff(attempts)).isoformat(),
+                    }},
+                    array_filters=[{"e.id": entry["id"]}]
+                ))
+
+        for doc_id, entry in delivered:
+            updates.append(UpdateOne(
+                {"_id": doc_id},
+                {"$pull": {"_outbox": {"id": entry["id"]}}}
+            ))
+
+    if dead:
+        await db.outbox_dead.insert_many(dead)
+    if updates:
+        await coll.bulk_write(updates, ordered=False)
+
+    return sum(len(items) for items in by_kind.values())
+
+
+async def dispatch_outbox() -> int:
+    processed = 0
+    for source in OUTBOX_SOURCES:
+        processed += await _dispatch_source(source)
+    return processed
+
+
+async def outbox_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+        try:
+            while await dispatch_outbox() >= OUTBOX_BATCH_SIZE:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Outbox dispatch failed")
@@ -1,74 +1,461 @@
+from datetime import datetime, timezone
+from urllib.parse import unquote
+
+from app.core.config import PROGRESS_SOURCE
 from app.core.database import get_db
 
-async def get_student_progress(user_id: str):
-    db = get_db()
+# Bump whenever the summary formula changes; stale summaries are rebuilt
+# from test_results on the next read.
+PROGRESS_SUMMARY_VERSION = 2
+RECENT_RESULTS_LIMIT = 10
+TREND_POINTS_LIMIT = 10
 
-    results = await db.test_results.find(
-        {"student_id": user_id},
-        {"_id": 0}   # ✅ prevent ObjectId serialization issues
-    ).to_list(1000)
-
-    if not results:
-        return {
-            "total_tests": 0,
-            "average_score": 0,
-            "average_accuracy": 0,
-            "subject_performance": {},
-            "recent_results": [],
-            "improvement_trend": []
-        }
+EMPTY_PROGRESS = {
+    "total_tests": 0,
+    "average_score": 0,
+    "average_accuracy": 0,
+    "subject_performance": {},
+    "recent_results": [],
+    "improvement_trend": []
+}
 
-    total_tests = len(results)
 
-    avg_score = sum(r.get("score", 0) for r in results) / total_tests
-    avg_accuracy = sum(r.get("accuracy", 0) for r in results) / total_tests
+# -------------------------------------------------
+# SUMMARY HELPERS
+# -------------------------------------------------
+SUBJECT_KEY_ESCAPES = {"%": "%25", ".": "%2E", "$": "%24"}
 
-    # ---------------- SUBJECT PERFORMANCE ----------------
+
+def _subject_key(subject: str) -> str:
+    """
+    Subjects are teacher-entered free text but become field names in the
+    summary, where "." would nest and a leading "$" or an empty name
+    breaks the $inc path. Escape them reversibly ("%" alone is empty).
+    """
+    return "".join(SUBJECT_KEY_ESCAPES.get(c, c) for c in subject) or "%"
+
+
+def _subject_name(key: str) -> str:
+    return "" if key == "%" else unquote(key)
+
+
+def _trend_point(result: dict) -> dict:
+    return {
+        "date": result.get("created_at"),
+        "score": result.get("score", 0),
+        "accuracy": result.get("accuracy", 0),
+    }
+
+
+def _build_summary(student_id: str, results: list) -> dict:
+    """
+    Compute a full progress summary from a student's result history.
+    """
     subject_performance = {}
 
     for r in results:
         for subject, data in r.get("subject_wise", {}).items():
-            if subject not in subject_performance:
-                subject_performance[subject] = {
+            key = _subject_key(subject)
+            if key not in subject_performance:
+                subject_performance[key] = {
                     "total": 0,
                     "correct": 0,
                     "tests": 0
                 }
 
-            subject_performance[subject]["total"] += data.get("total", 0)
-            subject_performance[subject]["correct"] += data.get("correct", 0)
-            subject_performance[subject]["tests"] += 1
+            subject_performance[key]["total"] += data.get("total", 0)
+            subject_performance[key]["correct"] += data.get("correct", 0)
+            subject_performance[key]["tests"] += 1
 
-    for subject in subject_performance:
-        total = subject_performance[subject]["total"]
-        correct = subject_performance[subject]["correct"]
+    ordered = sorted(results, key=lambda x: x.get("created_at", ""))
 
-        subject_performance[subject]["accuracy"] = (
-            round((correct / total) * 100, 2) if total > 0 else 0
-        )
+    return {
+        "student_id": student_id,
+        "version": PROGRESS_SUMMARY_VERSION,
+        "total_tests": len(results),
+        "score_sum": sum(r.get("score", 0) for r in results),
+        "accuracy_sum": sum(r.get("accuracy", 0) for r in results),
+        "subject_performance": subject_performance,
+        "recent_results": ordered[::-1][:RECENT_RESULTS_LIMIT],
+        "improvement_trend": [_trend_point(r) for r in ordered[-TREND_POINTS_LIMIT:]],
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
 
-    # ---------------- RECENT RESULTS ----------------
-    recent_results = sorted(
-        results,
-        key=lambda x: x.get("created_at", ""),
-        reverse=True
-    )[:10]
 
-    # ---------------- IMPROVEMENT TREND ----------------
-    improvement_trend = [
-        {
-            "date": r.get("created_at"),
-            "score": r.get("score", 0),
-            "accuracy": r.get("accuracy", 0),
+def _summary_to_progress(summary: dict) -> dict:
+    total_tests = summary.get("total_tests", 0)
+    if not total_tests:
+        return dict(EMPTY_PROGRESS)
+
+    subject_performance = {}
+    for key, data in summary.get("subject_performance", {}).items():
+        total = data.get("total", 0)
+        correct = data.get("correct", 0)
+        subject_performance[_subject_name(key)] = {
+            "total": total,
+            "correct": correct,
+            "tests": data.get("tests", 0),
+            "accuracy": round((correct / total) * 100, 2) if total > 0 else 0,
         }
-        for r in sorted(results, key=lambda x: x.get("created_at", ""))[-10:]
-    ]
 
     return {
         "total_tests": total_tests,
-        "average_score": round(avg_score, 2),
-        "average_accuracy": round(avg_accuracy, 2),
+        "average_score": round(summary.get("score_sum", 0) / total_tests, 2),
+        "average_accuracy": round(summary.get("accuracy_sum", 0) / total_tests, 2),
         "subject_performance": subject_performance,
-        "recent_results": recent_results,
-        "improvement_trend": improvement_trend
+        "recent_results": summary.get("recent_results", []),
+        "improvement_trend": summary.get("improvement_trend", [])
+    }
+
+
+# -------------------------------------------------
+# REBUILD FROM HISTORY
+# -------------------------------------------------
+async def rebuild_student_progress(student_id: str) -> dict:
+    db = get_db()
+
+    results = await db.test_results.find(
+        {"student_id": student_id},
+        {"_id": 0}
+    ).to_list(None)
+
+    summary = _build_summary(student_id, results)
+
+    await db.student_progress.replace_one(
+        {"student_id": student_id},
+        summary,
+        upsert=True
+    )
+
+    summary.pop("_id", None)
+    return summary
+
+
+async def rebuild_all_progress() -> int:
+    db = get_db()
+
+    student_ids = await db.test_results.distinct("student_id")
+    for student_id in student_ids:
+        await rebuild_student_progress(student_id)
+
+    return len(student_ids)
+
+
+# -------------------------------------------------
+# INCREMENTAL UPDATE (CALLED BY submit_test)
+# -------------------------------------------------
+async def record_test_result(result: dict):
+    """
+    Fold a freshly inserted result into the student's summary.
+    Falls back to a full rebuild when no current-version summary exists,
+    so history written before the summary is never lost.
+    """
+    db = get_db()
+    entry = {k: v for k, v in result.items() if k != "_id"}
+
+    inc = {
+        "total_tests": 1,
+        "score_sum": entry.get("score", 0),
+        "accuracy_sum": entry.get("accuracy", 0),
+    }
+    for subject, data in entry.get("subject_wise", {}).items():
+        key = _subject_key(subject)
+        inc[f"subject_performance.{key}.total"] = data.get("total", 0)
+        inc[f"subject_performance.{key}.correct"] = data.get("correct", 0)
+        inc[f"subject_performance.{key}.tests"] = 1
+
+    updated = await db.student_progress.update_one(
+        {
+            "student_id": entry["student_id"],
+            "version": PROGRESS_SUMMARY_VERSION
+        },
+        {
+            "$inc": inc,
+            "$push": {
+                "recent_results": {
+                    "$each": [entry],
+                    "$position": 0,
+                    "$slice": RECENT_RESULTS_LIMIT
+                },
+                "improvement_trend": {
+                    "$each": [_trend_point(entry)],
+                    "$slice": -TREND_POINTS_LIMIT
+                },
+            },
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()},
+        }
+    )
+
+    if updated.matched_count == 0:
+        await rebuild_student_progress(entry["student_id"])
+
+
+# -------------------------------------------------
+# AGGREGATION PIPELINE (NO MATERIALIZED SUMMARY)
+# -------------------------------------------------
+def _progress_pipeline(student_id: str) -> list:
+    return [
+        {"$match": {"student_id": student_id}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total_tests": {"$sum": 1},
+                    "score_sum": {"$sum": {"$ifNull": ["$score", 0]}},
+                    "accuracy_sum": {"$sum": {"$ifNull": ["$accuracy", 0]}},
+                }},
+            ],
+            "subjects": [
+                {"$project": {
+                    "subject": {"$objectToArray": {"$ifNull": ["$subject_wise", {}]}}
+                }},
+                {"$unwind": "$subject"},
+                {"$group": {
+                    "_id": "$subject.k",
+                    "total": {"$sum": {"$ifNull": ["$subject.v.total", 0]}},
+                    "correct": {"$sum": {"$ifNull": ["$subject.v.correct", 0]}},
+                    "tests": {"$sum": 1},
+                }},
+            ],
+            "recent": [
+                {"$sort": {"created_at": -1}},
+                {"$limit": RECENT_RESULTS_LIMIT},
+                {"$project": {"_id": 0}},
+            ],
+            "trend": [
+                {"$sort": {"created_at": -1}},
+                {"$limit": TREND_POINTS_LIMIT},
+                {"$project": {
+                    "_id": 0,
+                    "date": {"$ifNull": ["$created_at", None]},
+                    "score": {"$ifNull": ["$score", 0]},
+                    "accuracy": {"$ifNull": ["$accuracy", 0]},
+                }},
+            ],
+        }},
+    ]
+
+
+async def aggregate_student_progress(user_id: str) -> dict:
+    """
+    Same response as the summary path, computed server-side by Mongo
+    so only the reduced facets cross the wire.
+    """
+    db = get_db()
+
+    facets = await db.test_results.aggregate(
+        _progress_pipeline(user_id)
+    ).to_list(1)
+
+    facet = facets[0] if facets else {}
+    totals = facet.get("totals") or [{}]
+
+    summary = {
+        "total_tests": totals[0].get("total_tests", 0),
+        "score_sum": totals[0].get("score_sum", 0),
+        "accuracy_sum": totals[0].get("accuracy_sum", 0),
+        "subject_performance": {
+            _subject_key(s["_id"]): {
+                "total": s["total"],
+                "correct": s["correct"],
+                "tests": s["tests"],
+            }
+            for s in facet.get("subjects", [])
+        },
+        "recent_results": facet.get("recent", []),
+        "improvement_trend": facet.get("trend", [])[::-1],
+    }
+
+    return _summary_to_progress(summary)
+
+
+# -------------------------------------------------
+# READ
+# -------------------------------------------------
+async def get_student_progress(user_id: str):
+    if PROGRESS_SOURCE == "pipeline":
+        return await aggregate_student_progress(user_id)
+
+    db = get_db()
+
+    summary = await db.student_progress.find_one(
+        {"student_id": user_id},
+        {"_id": 0}
+    )
+
+    if not summary or summary.get("version") != PROGRESS_SUMMARY_VERSION:
+        summary = await rebuild_student_progress(user_id)
+
+    return _summary_to_progress(summary)
+
+
+# -------------------------------------------------
+# DOWNSAMPLED TRENDS
+# -------------------------------------------------
+TREND_RESOLUTIONS = {
+    "attempt": None,
+    "daily": "day",
+    "weekly": "week",
+    "monthly": "month",
+}
+MAX_TREND_POINTS = 200
+
+
+def _trend_bucket_stages(resolution: str, points: int) -> list:
+    unit = TREND_RESOLUTIONS[resolution]
+
+    if unit is None:
+        # Spread attempts evenly over `points` buckets by rank.
+        bucket_stages = [
+            {"$setWindowFields": {
+                "partitionBy": "$series",
+                "sortBy": {"created_at": 1},
+                "output": {
+                    "n": {"$documentNumber": {}},
+                    "total": {
+                        "$count": {},
+                        "window": {"documents": ["unbounded", "unbounded"]}
+                    },
+                },
+            }},
+            {"$addFields": {
+                "bucket": {"$floor": {"$divide": [
+                    {"$multiply": [{"$subtract": ["$n", 1]}, points]},
+                    "$total"
+                ]}}
+            }},
+        ]
+    else:
+        trunc = {
+            "date": {"$dateFromString": {"dateString": "$created_at"}},
+            "unit": unit,
+        }
+        if unit == "week":
+            trunc["startOfWeek"] = "monday"
+        bucket_stages = [{"$addFields": {"bucket": {"$dateTrunc": trunc}}}]
+
+    return bucket_stages + [
+        {"$group": {
+            "_id": {"series": "$series", "bucket": "$bucket"},
+            "date": {"$min": "$created_at"},
+            "count": {"$sum": 1},
+            "score_sum": {"$sum": "$score"},
+            "max_score": {"$max": "$score"},
+            "accuracy_sum": {"$sum": "$accuracy"},
+        }},
+        {"$sort": {"date": 1}},
+    ]
+
+
+def _trend_pipeline(student_id: str, start, end, resolution: str, points: int) -> list:
+    match = {"student_id": student_id}
+    if start or end:
+        match["created_at"] = {}
+        if start:
+            match["created_at"]["$gte"] = start
+        if end:
+            match["created_at"]["$lt"] = end
+
+    subject_correct = {"$ifNull": ["$subject.v.correct", 0]}
+    subject_wrong = {"$ifNull": ["$subject.v.wrong", 0]}
+    subject_answered = {"$add": [subject_correct, subject_wrong]}
+
+    return [
+        {"$match": match},
+        {"$facet": {
+            "overall": [
+                {"$project": {
+                    "_id": 0,
+                    "series": {"$literal": None},
+                    "created_at": 1,
+                    "score": {"$ifNull": ["$score", 0]},
+                    "accuracy": {"$ifNull": ["$accuracy", 0]},
+                }},
+                *_trend_bucket_stages(resolution, points),
+            ],
+            "subjects": [
+                {"$project": {
+                    "_id": 0,
+                    "created_at": 1,
+                    "subject": {"$objectToArray": {"$ifNull": ["$subject_wise", {}]}},
+                }},
+                {"$unwind": "$subject"},
+                {"$project": {
+                    "series": "$subject.k",
+                    "created_at": 1,
+                    # Same scoring as submit_test: +4 correct, -1 wrong
+                    "score": {"$subtract": [{"$multiply": [subject_correct, 4]}, subject_wrong]},
+                    "accuracy": {"$cond": [
+                        {"$gt": [subject_answered, 0]},
+                        {"$multiply": [{"$divide": [subject_correct, subject_answered]}, 100]},
+                        0
+                    ]},
+                }},
+                *_trend_bucket_stages(resolution, points),
+            ],
+        }},
+    ]
+
+
+def _downsample(buckets: list, points: int) -> list:
+    """
+    Merge adjacent buckets so a series never exceeds `points` entries.
+    """
+    if len(buckets) > points:
+        size = -(-len(buckets) // points)
+        merged = []
+        for i in range(0, len(buckets), size):
+            chunk = buckets[i:i + size]
+            merged.append({
+                "date": chunk[0]["date"],
+                "count": sum(b["count"] for b in chunk),
+                "score_sum": sum(b["score_sum"] for b in chunk),
+                "max_score": max(b["max_score"] for b in chunk),
+                "accuracy_sum": sum(b["accuracy_sum"] for b in chunk),
+            })
+        buckets = merged
+
+    return [
+        {
+            "date": b["date"],
+            "count": b["count"],
+            "mean_score": round(b["score_sum"] / b["count"], 2),
+            "max_score": b["max_score"],
+            "mean_accuracy": round(b["accuracy_sum"] / b["count"], 2),
+        }
+        for b in buckets
+    ]
+
+
+async def get_progress_trend(
+    user_id: str,
+    start: str | None = None,
+    end: str | None = None,
+    resolution: str = "attempt",
+    points: int = 30,
+) -> dict:
+    """
+    Server-side downsampled score/accuracy series, overall and per subject.
+    `end` is exclusive; each series holds at most `points` buckets.
+    """
+    db = get_db()
+
+    facets = await db.test_results.aggregate(
+        _trend_pipeline(user_id, start, end, resolution, points)
+    ).to_list(1)
+    facet = facets[0] if facets else {}
+
+    subjects = {}
+    for row in facet.get("subjects", []):
+        subjects.setdefault(row["_id"]["series"], []).append(row)
+
+    return {
+        "resolution": resolution,
+        "start": start,
+        "end": end,
+        "overall": _downsample(facet.get("overall", []), points),
+        "subjects": {
+            subject: _downsample(rows, points)
+            for subject, rows in subjects.items()
+        },
     }
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from app.core.config import (
+    SIMILAR_DOUBTS_DIM,
+    SIMILAR_DOUBTS_MIN_SCORE,
+    SIMILAR_DOUBTS_REFRESH_SECONDS,
+)
+from app.core.database import get_db
+from app.utils.text_index import HashedTfidfIndex
+
+logger = logging.getLogger(__name__)
+
+# Refreshes re-read this far before the newest answer seen, so answers
+# stamped by workers with slightly skewed clocks are not missed
+REFRESH_OVERLAP = timedelta(minutes=5)
+DOUBT_PROJECTION = {"_id": 0, "doubt_id": 1, "subject": 1, "question_text": 1, "answered_at": 1}
+
+# subject -> index over answered doubts (per worker process), the doubt
+# ids already in it and the newest answered_at seen
+_indexes: dict[str, HashedTfidfIndex] = {}
+_indexed_ids: set[str] = set()
+_indexed_through = ""
+
+
+def _add(indexes: dict, indexed_ids: set, doubt: dict) -> bool:
+    if doubt["doubt_id"] in indexed_ids:
+        return False
+
+    if doubt["subject"] not in indexes:
+        indexes[doubt["subject"]] = HashedTfidfIndex(dim=SIMILAR_DOUBTS_DIM)
+    indexes[doubt["subject"]].add(doubt["doubt_id"], doubt["question_text"])
+    indexed_ids.add(doubt["doubt_id"])
+    return True
+
+
+# -------------------------------------------------
+# BUILD / UPDATE
+# -------------------------------------------------
+async def build_similarity_index() -> int:
+    """
+    Build into fresh structures and swap them in, so queries (and answers
+    indexed meanwhile) never see a half-built or doubled index. Answers
+    that land on the old index during the build are picked up by the
+    refresh that follows.
+    """
+    global _indexes, _indexed_ids, _indexed_through
+
+    indexes: dict[str, HashedTfidfIndex] = {}
+    indexed_ids: set[str] = set()
+    through = ""
+
+    cursor = get_db().doubts.find(
+        {"status": "answered"},
+        DOUBT_PROJECTION
+    ).sort("answered_at", 1)
+
+    async for doubt in cursor:
+        _add(indexes, indexed_ids, doubt)
+        through = max(through, doubt.get("answered_at") or "")
+
+    _indexes, _indexed_ids, _indexed_through = indexes, indexed_ids, through
+    count = len(indexed_ids)
+    logger.info(f"Similar-doubt index built from {count} answered doubts")
+
+    await refresh_similarity_index()
+    return count
+
+
+async def refresh_similarity_index() -> int:
+    """
+    Add doubts answered since the last build or refresh, including those
+    answered through other workers.
+    """
+    global _indexed_through
+
+    query = {"status": "answered"}
+    if _indexed_through:
+        since = datetime.fromisoformat(_indexed_through) - REFRESH_OVERLAP
+        query["answered_at"] = {"$gte": since.isoformat()}
+
+    added = 0
+    async for doubt in get_db().doubts.find(query, DOUBT_PROJECTION).sort("answered_at", 1):
+        added += _add(_indexes, _indexed_ids, doubt)
+        _indexed_through = max(_indexed_through, doubt.get("answered_at") or "")
+
+    return added
+
+
+def index_answered_doubt(doubt_id: str, subject: str, question_text: str):
+    _add(_indexes, _indexed_ids, {
+        "doubt_id": doubt_id,
+        "subject": subject,
+        "question_text": question_text,
+    })
+
+
+async def similarity_index_loop():
+    try:
+        await build_similarity_index()
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        # The first refresh then reads every answered doubt
+        logger.exception("Similar-doubt index build failed")
+
+    while True:
+        await asyncio.sleep(SIMILAR_DOUBTS_REFRESH_SECONDS)
+        try:
+            added = await refresh_similarity_index()
+            if added:
+                logger.info(f"Similar-doubt index refreshed with {added} answered doubts")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Similar-doubt index refresh failed")
+
+
+# -------------------------------------------------
+# QUERY
+# -------------------------------------------------
+async def find_similar_doubts(subject: str, question_text: str, k: int = 3) -> list:
+    """
+    Top-k answered doubts in the same subject, with their answers.
+    """
+    index = _indexes.get(subject)
+    if not index or not question_text:
+        return []
+
+    hits = [
+        (doubt_id, score)
+        for doubt_id, score in index.search(question_text, k)
+        if score >= SIMILAR_DOUBTS_MIN_SCORE
+    ]
+    if not hits:
+        return []
+
+    db = get_db()
+    docs = await db.doubts.find(
+        {"doubt_id": {"$in": [doubt_id for doubt_id, _ in hits]}},
+        {
+            "_id": 0,
+            "doubt_id": 1,
+            "subject": 1,
+            "question_text": 1,
+            "answer_text": 1,
+            "answer_image_id": 1,
+            "answered_at": 1,
+        }
+    ).to_list(len(hits))
+
+    by_id = {d["doubt_id"]: d for d in docs}
+    similar = []
+    for doubt_id, score in hits:
+        if doubt_id in by_id:
+            similar.append({**by_id[doubt_id], "score": round(score, 4)})
+
+    return similar
@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 import uuid
 
 from app.core.database import get_db
+from app.services.progress_service import record_test_result
 from app.utils.mongo import serialize_mongo, serialize_mongo_list
 
 
@@ -74,6 +75,7 @@ async def submit_test(data, user: dict):
     }
 
     await db.test_results.insert_one(result_doc)
+    await record_test_result(result_doc)
 
     # ✅ Safe even if Mongo injects _id later
     return serialize_mongo(result_doc)
@@ -0,0 +1,199 @@
+from fastapi import HTTPException, UploadFile
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+import asyncio
+import base64
+import logging
+import time
+
+from app.core.config import (
+    TRANSCRIPTION_SEGMENT_SECONDS,
+    TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS,
+    TRANSCRIPTION_SEGMENT_CONCURRENCY,
+    TRANSCRIPTION_CACHE_TTL_DAYS,
+    AUDIO_PREPROCESS_ENABLED,
+)
+from app.core.database import get_db
+from app.utils.audio import (
+    detect_audio_format,
+    preprocess_audio,
+    wav_segments,
+    read_wav_segment,
+    stitch_transcripts,
+)
+from app.services.blob_service import spool_upload, spool_blob
+from app.services.llm_service import llm_complete, route_model
+from app.services.admission_service import charge_llm_budget, estimate_transcription_tokens
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIBE_PROMPT = "Transcribe this audio accurately into English."
+
+
+# -------------------------------------------------
+# CACHE (BY AUDIO SHA-256)
+# -------------------------------------------------
+async def _cached_transcript(sha256: str, model: str) -> dict | None:
+    return await get_db().transcription_cache.find_one(
+        {"sha256": sha256, "model": model}, {"_id": 0}
+    )
+
+
+async def _cache_transcript(sha256: str, model: str, result: dict):
+    now = datetime.now(timezone.utc)
+    await get_db().transcription_cache.update_one(
+        {"sha256": sha256, "model": model},
+        {"$setOnInsert": {
+            "sha256": sha256,
+            "model": model,
+            "text": result["text"],
+            "format": result["format"],
+            "segments": result["segments"],
+            "created_at": now.isoformat(),
+            "expires_at": now + timedelta(days=TRANSCRIPTION_CACHE_TTL_DAYS),
+        }},
+        upsert=True
+    )
+
+
+def _cached_result(cached: dict) -> dict:
+    return {
+        "success": True,
+        "text": cached["text"],
+        "format": cached["format"],
+        "segments": cached["segments"],
+        "cached": True,
+    }
+
+
+# -------------------------------------------------
+# TRANSCRIPTION
+# -------------------------------------------------
+def _transcription_messages(audio: bytes, fmt: str) -> list:
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": TRANSCRIBE_PROMPT},
+                {
+                    "type": "input_audio",
+                    "input_audio": {
+                        "data": base64.b64encode(audio).decode("utf-8"),
+                        "format": fmt
+                    }
+                }
+            ],
+        }
+    ]
+
+
+async def _transcribe_segments(path: str, fmt: str) -> tuple[str, int]:
+    """
+    WAV longer than one segment is split into overlapping segments that
+    are transcribed concurrently and stitched. Other formats are already
+    compressed and go up in one request.
+    """
+    spans = None
+    if fmt == "wav":
+        spans = await asyncio.to_thread(
+            wav_segments,
+            path,
+            TRANSCRIPTION_SEGMENT_SECONDS,
+            TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS,
+        )
+
+    if not spans or len(spans) == 1:
+        audio = await asyncio.to_thread(Path(path).read_bytes)
+        return await llm_complete("transcription", _transcription_messages(audio, fmt)), 1
+
+    slots = asyncio.Semaphore(TRANSCRIPTION_SEGMENT_CONCURRENCY)
+
+    async def transcribe_span(start: int, frames: int) -> str:
+        async with slots:
+            # Read lazily so only the segments in flight are in memory
+            audio = await asyncio.to_thread(read_wav_segment, path, start, frames)
+            return await llm_complete("transcription", _transcription_messages(audio, "wav"))
+
+    texts = await asyncio.gather(*(transcribe_span(*span) for span in spans))
+    return stitch_transcripts(texts), len(spans)
+
+
+async def _preprocess(src: str, dst: str) -> dict | None:
+    """
+    Shrink WAV before upload. Any failure falls back to the original.
+    """
+    try:
+        stats = await preprocess_audio(src, dst)
+    except Exception as e:
+        logger.warning(f"Audio preprocessing failed, sending original: {e}")
+        return None
+
+    if stats:
+        logger.info(
+            f"Audio preprocessed: {stats['input_bytes']} -> {stats['output_bytes']} bytes "
+            f"({stats['input_channels']}ch {stats['input_rate']} Hz -> mono {stats['sample_rate']} Hz, "
+            f"{stats['duration_in']}s -> {stats['duration_out']}s) in {stats['processing_ms']} ms"
+        )
+    return stats
+
+
+async def _transcribe_spooled(path: str, sha256: str, size: int, current_user: dict) -> dict:
+    with open(path, "rb") as f:
+        fmt = detect_audio_format(f.read(16))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Unsupported audio format")
+
+    processed_path = f"{path}.pre"
+    try:
+        if fmt == "wav" and AUDIO_PREPROCESS_ENABLED:
+            stats = await _preprocess(path, processed_path)
+            if stats:
+                path, size = processed_path, stats["output_bytes"]
+
+        await charge_llm_budget(current_user, estimate_transcription_tokens(size))
+
+        started = time.perf_counter()
+        text, segments = await _transcribe_segments(path, fmt)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Audio transcription failed: {e}")
+        raise HTTPException(status_code=500, detail="Audio transcription failed")
+
+    finally:
+        Path(processed_path).unlink(missing_ok=True)
+
+    logger.info(
+        f"Transcribed {size} bytes of {fmt} in {segments} segment(s) "
+        f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+
+    result = {"success": True, "text": text, "format": fmt, "segments": segments, "cached": False}
+    await _cache_transcript(sha256, route_model("transcription"), result)
+    return result
+
+
+async def transcribe_upload(upload: UploadFile, current_user: dict) -> dict:
+    path, sha256, size = await spool_upload(upload)
+    try:
+        cached = await _cached_transcript(sha256, route_model("transcription"))
+        if cached:
+            return _cached_result(cached)
+        return await _transcribe_spooled(path, sha256, size, current_user)
+    finally:
+        Path(path).unlink(missing_ok=True)
+
+
+async def transcribe_blob(blob_id: str, current_user: dict) -> dict:
+    # Blob ids are the content's SHA-256, so a hit skips the download
+    cached = await _cached_transcript(blob_id, route_model("transcription"))
+    if cached:
+        return _cached_result(cached)
+
+    path = await spool_blob(blob_id)
+    try:
+        return await _transcribe_spooled(path, blob_id, Path(path).stat().st_size, current_user)
+    finally:
+        Path(path).unlink(missing_ok=True)
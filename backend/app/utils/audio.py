@@ -0,0 +1,288 @@
+# app/utils/audio.py
+
+import asyncio
+import io
+import os
+import re
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.core.config import (
+    AUDIO_SAMPLE_RATE,
+    AUDIO_SILENCE_DB,
+    AUDIO_TARGET_DBFS,
+    AUDIO_WORKERS,
+)
+
+# Never louder than this after normalization, whatever the RMS target
+PEAK_LIMIT_DBFS = -1.0
+FRAME_SECONDS = 0.02
+# Silence kept around speech so the first and last words are not clipped
+TRIM_PADDING_SECONDS = 0.2
+LOWPASS_TAPS = 101
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def detect_audio_format(head: bytes) -> str | None:
+    """
+    Sniff the container from the first bytes of a file, as the name
+    providers expect in `input_audio.format`. Browsers and phones label
+    uploads inconsistently, so the filename and content type are not
+    trusted.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if head[4:8] == b"ftyp":
+        return "m4a"
+    if head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if head[:3] == b"ID3":
+        return "mp3"
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # MPEG frame sync: layer bits 00 mean an AAC ADTS stream
+        return "aac" if head[1] & 0x06 == 0 else "mp3"
+    return None
+
+
+# -------------------------------------------------
+# WAV SEGMENTS
+# -------------------------------------------------
+def wav_segments(path: str, segment_seconds: float, overlap_seconds: float) -> list[tuple[int, int]] | None:
+    """
+    (start_frame, frame_count) spans covering the file, each overlapping
+    the next by `overlap_seconds` so words cut at a boundary are heard
+    whole in one of them. None when the stdlib cannot read the file
+    (compressed or extensible WAV), which is then sent unsplit.
+    """
+    try:
+        with wave.open(path, "rb") as w:
+            rate, total = w.getframerate(), w.getnframes()
+    except (wave.Error, EOFError):
+        return None
+
+    segment = max(1, int(segment_seconds * rate))
+    overlap = int(overlap_seconds * rate)
+
+    spans = []
+    start = 0
+    while True:
+        end = min(start + segment + overlap, total)
+        spans.append((start, end - start))
+        if end >= total:
+            return spans
+        start += segment
+
+
+def read_wav_segment(path: str, start: int, frames: int) -> bytes:
+    with wave.open(path, "rb") as src:
+        src.setpos(start)
+        data = src.readframes(frames)
+        out = io.BytesIO()
+        with wave.open(out, "wb") as dst:
+            dst.setnchannels(src.getnchannels())
+            dst.setsampwidth(src.getsampwidth())
+            dst.setframerate(src.getframerate())
+            dst.writeframes(data)
+    return out.getvalue()
+
+
+# -------------------------------------------------
+# PREPROCESSING
+# -------------------------------------------------
+def _decode_pcm(data: bytes, sample_width: int, channels: int) -> np.ndarray:
+    """
+    PCM frames to float32 in [-1, 1], shape (frames, channels).
+    """
+    # A truncated upload can end mid-frame
+    data = data[:len(data) - len(data) % (sample_width * channels)]
+    if sample_width == 1:
+        samples = (np.frombuffer(data, np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 3:
+        raw = np.frombuffer(data, np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - (1 << 24), ints)
+        samples = ints.astype(np.float32) / (1 << 23)
+    else:
+        dtype = {2: "<i2", 4: "<i4"}[sample_width]
+        samples = np.frombuffer(data, dtype).astype(np.float32) / (1 << (8 * sample_width - 1))
+    return samples.reshape(-1, channels)
+
+
+def _resample(signal: np.ndarray, rate: int, target: int) -> np.ndarray:
+    """
+    Low-pass below the new Nyquist frequency (windowed sinc), then
+    interpolate. Only ever downsamples.
+    """
+    cutoff = 0.5 * target / rate * 0.9
+    n = np.arange(LOWPASS_TAPS) - (LOWPASS_TAPS - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hanning(LOWPASS_TAPS)
+    filtered = np.convolve(signal, (taps / taps.sum()).astype(np.float32), mode="same")
+
+    positions = np.arange(int(len(signal) * target / rate)) * (rate / target)
+    return np.interp(positions, np.arange(len(signal)), filtered).astype(np.float32)
+
+
+def _trim_silence(signal: np.ndarray, rate: int, silence_db: float) -> np.ndarray:
+    frame = max(1, int(FRAME_SECONDS * rate))
+    frames = len(signal) // frame
+    if frames == 0:
+        return signal
+
+    rms = np.sqrt(np.mean(signal[:frames * frame].reshape(frames, frame) ** 2, axis=1))
+    loud = np.nonzero(rms > rms.max() * 10 ** (silence_db / 20))[0]
+    if len(loud) == 0:
+        return signal
+
+    padding = int(TRIM_PADDING_SECONDS * rate)
+    start = max(0, loud[0] * frame - padding)
+    end = min(len(signal), (loud[-1] + 1) * frame + padding)
+    return signal[start:end]
+
+
+def _normalize(signal: np.ndarray, target_dbfs: float) -> np.ndarray:
+    rms = float(np.sqrt(np.mean(signal ** 2))) if len(signal) else 0.0
+    peak = float(np.abs(signal).max()) if len(signal) else 0.0
+    if rms == 0:
+        return signal
+
+    gain = min(10 ** (target_dbfs / 20) / rms, 10 ** (PEAK_LIMIT_DBFS / 20) / peak)
+    return signal * gain
+
+
+def preprocess_wav(
+    src: str,
+    dst: str,
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+    silence_db: float = AUDIO_SILENCE_DB,
+    target_dbfs: float = AUDIO_TARGET_DBFS,
+) -> dict | None:
+    """
+    Used for:
+    - audio transcription
+
+    Downmixes to mono, resamples to `sample_rate` (never up), trims
+    leading and trailing silence and normalizes loudness, writing 16-bit
+    PCM WAV to `dst`. Returns None when the stdlib cannot read `src`.
+    Runs inside the worker pool, so it must stay picklable.
+    """
+    started = time.perf_counter()
+
+    try:
+        with wave.open(src, "rb") as w:
+            channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+            data = w.readframes(w.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    if width not in (1, 2, 3, 4):
+        return None
+
+    signal = _decode_pcm(data, width, channels).mean(axis=1)
+    del data
+
+    if rate > sample_rate:
+        signal = _resample(signal, rate, sample_rate)
+        out_rate = sample_rate
+    else:
+        out_rate = rate
+
+    duration_in = len(signal) / out_rate
+    signal = _trim_silence(signal, out_rate, silence_db)
+    signal = _normalize(signal, target_dbfs)
+
+    pcm = (np.clip(signal, -1, 1) * 32767).astype("<i2")
+    with wave.open(dst, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(out_rate)
+        out.writeframes(pcm.tobytes())
+
+    return {
+        "input_bytes": os.path.getsize(src),
+        "output_bytes": os.path.getsize(dst),
+        "input_channels": channels,
+        "input_rate": rate,
+        "sample_rate": out_rate,
+        "duration_in": round(duration_in, 2),
+        "duration_out": round(len(pcm) / out_rate, 2),
+        "processing_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=AUDIO_WORKERS)
+
+    return _pool
+
+
+async def preprocess_audio(src: str, dst: str) -> dict | None:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), preprocess_wav, src, dst)
+
+
+def shutdown_audio_pool():
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# -------------------------------------------------
+# STITCHING
+# -------------------------------------------------
+WORD_RE = re.compile(r"\W+")
+
+
+def _norm(word: str) -> str:
+    return WORD_RE.sub("", word.lower())
+
+
+def _seam(tail: list[str], head: list[str], slack: int) -> tuple[int, int, int]:
+    """
+    Longest run ending within `slack` words of the end of `tail` that
+    also appears starting within `slack` words of the start of `head`,
+    as (tail_end, head_start, length).
+    """
+    best = (len(tail), 0, 0)
+    for end in range(len(tail), max(len(tail) - slack, 0) - 1, -1):
+        for start in range(min(slack, len(head)) + 1):
+            for length in range(min(end, len(head) - start), best[2], -1):
+                if tail[end - length:end] == head[start:start + length]:
+                    best = (end, start, length)
+                    break
+    return best
+
+
+def stitch_transcripts(texts: list[str], window: int = 12, slack: int = 3, min_overlap: int = 2) -> str:
+    """
+    Join transcripts of overlapping segments, dropping the words both
+    sides heard. The seam must sit near the end of one transcript and the
+    start of the next, so a phrase repeated elsewhere in the audio is not
+    mistaken for the overlap. Case and punctuation are ignored.
+    """
+    words: list[str] = []
+    for text in texts:
+        following = text.split()
+        tail = [_norm(w) for w in words[-window:]]
+        head = [_norm(w) for w in following[:window]]
+
+        end, start, length = _seam(tail, head, slack)
+        if length >= min_overlap:
+            words = words[:len(words) - len(tail) + end] + following[start + length:]
+        else:
+            words += following
+
+    return " ".join(words)
@@ -0,0 +1,90 @@
+# app/utils/images.py
+
+import asyncio
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from app.core.config import (
+    IMAGE_MAX_DIMENSION,
+    IMAGE_QUALITY,
+    IMAGE_FORMAT,
+    THUMBNAIL_DIMENSION,
+    IMAGE_WORKERS,
+)
+
+CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    if fmt == "JPEG" and img.mode != "RGB":
+        img = img.convert("RGB")
+
+    out = io.BytesIO()
+    img.save(out, format=fmt, quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def normalize_image(
+    path: str,
+    max_dimension: int = IMAGE_MAX_DIMENSION,
+    quality: int = IMAGE_QUALITY,
+    fmt: str = IMAGE_FORMAT,
+    thumbnail_dimension: int = THUMBNAIL_DIMENSION,
+) -> dict:
+    """
+    Used for:
+    - doubt image upload
+
+    EXIF-orients, downscales and re-encodes the image at `path` and
+    renders a thumbnail. Runs inside the worker pool, so it must stay
+    picklable; it takes a spool path so the upload is never pickled.
+    """
+    started = time.perf_counter()
+
+    img = Image.open(path)
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+
+    img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    image_bytes = _encode(img, fmt, quality)
+
+    thumb = img.copy()
+    thumb.thumbnail((thumbnail_dimension, thumbnail_dimension), Image.LANCZOS)
+    thumbnail_bytes = _encode(thumb, fmt, quality)
+
+    return {
+        "image": image_bytes,
+        "thumbnail": thumbnail_bytes,
+        "content_type": CONTENT_TYPES[fmt],
+        "width": img.width,
+        "height": img.height,
+        "processing_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+
+    return _pool
+
+
+async def process_image(path: str) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), normalize_image, path)
+
+
+def shutdown_image_pool():
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,115 @@
+# app/utils/json_stream.py
+
+import json
+import re
+from typing import Callable
+
+STRING_SPECIAL = re.compile(r'["\\]')
+CODE_SPECIAL = re.compile(r'["{}\]]')
+
+
+class JsonArrayStreamParser:
+    """
+    Pulls complete objects out of a JSON array while the text is still
+    arriving, e.g. `{"questions": [{...}, {...}` from a streaming model.
+
+    The scanner only tracks string/escape state and brace depth, jumping
+    between the few characters that can change it. Anything before the array (prose, code
+    fences, other keys) is skipped. With no key, the first array is used.
+    `repair` is tried on objects that fail to parse as-is.
+    """
+
+    def __init__(self, key: str | None, repair: Callable[[str], str] | None = None):
+        self._marker = f'"{key}"' if key else ""
+        self._repair = repair
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+
+    def _find_array(self) -> bool:
+        marker = self._buffer.find(self._marker)
+        if marker < 0:
+            return False
+        bracket = self._buffer.find("[", marker + len(self._marker))
+        if bracket < 0:
+            return False
+        self._pos = bracket + 1
+        self._in_array = True
+        return True
+
+    def _parse(self, text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+        if self._repair:
+            try:
+                return json.loads(self._repair(text))
+            except json.JSONDecodeError:
+                pass
+        return None
+
+    def feed(self, text: str) -> list:
+        """
+        Add text and return the objects completed by it.
+        """
+        self._buffer += text
+        items = []
+
+        if self.done or (not self._in_array and not self._find_array()):
+            return items
+
+        buf = self._buffer
+        i = self._pos
+        while True:
+            if self._escaped:
+                if i >= len(buf):
+                    break
+                self._escaped = False
+                i += 1
+                continue
+
+            # Jump straight to the next character that can change state
+            match = (STRING_SPECIAL if self._in_string else CODE_SPECIAL).search(buf, i)
+            if match is None:
+                i = len(buf)
+                break
+            i = match.start()
+            ch = buf[i]
+
+            if self._in_string:
+                if ch == "\\":
+                    self._escaped = True
+                else:
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    item = self._parse(buf[self._start:i + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._start = None
+            elif self._depth == 0:
+                self.done = True
+                break
+            i += 1
+
+        # Drop consumed text so the buffer stays bounded by one object
+        keep_from = self._start if self._start is not None else i
+        self._buffer = buf[keep_from:]
+        self._pos = i - keep_from
+        if self._start is not None:
+            self._start = 0
+
+        return items
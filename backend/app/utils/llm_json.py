@@ -0,0 +1,84 @@
+# app/utils/llm_json.py
+
+import json
+import re
+
+from app.utils.json_stream import JsonArrayStreamParser
+
+FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+# One pass: a JSON string literal (so its contents are left alone), or a
+# trailing comma, a missing comma between values, or a Python literal
+REPAIR_RE = re.compile(
+    r'("(?:[^"\\]|\\.)*")'
+    r"|,(\s*[}\]])"
+    r"|([}\]])(\s*)(?=[{\[])"
+    r"|\b(True|False|None)\b"
+)
+PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def strip_fences(text: str) -> str:
+    match = FENCE_RE.search(text)
+    return match.group(1) if match else text
+
+
+def _repair(match: re.Match) -> str:
+    literal, trailing, closer, gap, py_literal = match.groups()
+    if literal is not None:
+        # Raw control characters are invalid inside JSON strings
+        return literal.replace("\r", "\\r").replace("\n", "\\n").replace("\t", "\\t")
+    if trailing is not None:
+        return trailing
+    if closer is not None:
+        return f"{closer},{gap}"
+    return PY_LITERALS[py_literal]
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix the defects models commonly emit: trailing commas, missing
+    commas between objects, Python literals and raw newlines in strings.
+    String contents are otherwise left untouched.
+    """
+    return REPAIR_RE.sub(_repair, text)
+
+
+_decoder = json.JSONDecoder()
+
+
+def extract_json(raw: str):
+    """
+    Parse the first JSON value in `raw`, ignoring fences and prose around
+    it and anything after it. Returns None when it cannot be parsed even
+    after repair.
+    """
+    text = strip_fences(raw)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+
+    text = text[min(starts):]
+    for candidate in (text, repair_json(text)):
+        try:
+            return _decoder.raw_decode(candidate)[0]
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def extract_questions(raw: str) -> tuple[list[dict], bool]:
+    """
+    Returns (questions, complete). When the output cannot be parsed as a
+    whole (typically truncated), every question object that did complete
+    is salvaged and `complete` is False.
+    """
+    parsed = extract_json(raw)
+    if isinstance(parsed, dict) and isinstance(parsed.get("questions"), list):
+        return [q for q in parsed["questions"] if isinstance(q, dict)], True
+    if isinstance(parsed, list):
+        return [q for q in parsed if isinstance(q, dict)], True
+
+    text = strip_fences(raw)
+    key = "questions" if '"questions"' in text else None
+    parser = JsonArrayStreamParser(key, repair=repair_json)
+    return parser.feed(text), False
@@ -0,0 +1,194 @@
+# app/utils/pubsub.py
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from bson import ObjectId
+from pymongo.cursor import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+# How far before the last seen event a recreated tail starts re-reading;
+# covers clock skew between workers
+RESUME_SLACK = timedelta(seconds=60)
+
+
+# -------------------------------------------------
+# BROKERS
+# -------------------------------------------------
+class Broker(ABC):
+    """
+    Carries events between workers. Every published message is handed to
+    the handler registered by start() in each worker, including the
+    publishing one.
+    """
+
+    @abstractmethod
+    async def start(self, handler: Handler):
+        """
+        Begin delivering published messages to `handler`.
+        """
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, message: dict):
+        """
+        Send `message` to every worker's handler.
+        """
+
+
+class InMemoryBroker(Broker):
+    """
+    Single-process broker: delivery is a direct call.
+    """
+
+    def __init__(self):
+        self._handler: Handler | None = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    async def publish(self, message: dict):
+        if self._handler:
+            await self._handler(message)
+
+
+class MongoCappedBroker(Broker):
+    """
+    Multi-worker broker on a capped collection. Each worker tails the
+    collection and dispatches new documents to its local subscribers.
+    """
+
+    def __init__(self, get_db, collection: str = "events", size_bytes: int = 16 * 1024 * 1024):
+        self._get_db = get_db
+        self._collection = collection
+        self._size_bytes = size_bytes
+        self._task: asyncio.Task | None = None
+
+    async def _ensure_collection(self):
+        db = self._get_db()
+        coll = db[self._collection]
+        try:
+            await db.create_collection(self._collection, capped=True, size=self._size_bytes)
+        except CollectionInvalid:
+            # Exists already, possibly created by a worker booting alongside
+            pass
+
+        if not (await coll.options()).get("capped"):
+            raise RuntimeError(f"Event collection '{self._collection}' exists but is not capped")
+
+        # Tailable cursors die on an empty capped collection
+        if await coll.estimated_document_count() == 0:
+            await coll.insert_one({"type": "init"})
+
+    async def _resume_point(self, coll, last_id: ObjectId | None) -> tuple[dict, bool]:
+        """
+        ObjectIds minted by different workers are not in insertion order,
+        so resuming with `_id > last_id` can skip events. Instead, re-read
+        in natural (insertion) order from a little before `last_id` and
+        skip up to it. Returns (query, skip_until_last).
+        """
+        if last_id is None:
+            return {}, False
+
+        since = ObjectId.from_datetime(last_id.generation_time - RESUME_SLACK)
+        still_there = await coll.find_one({"_id": last_id}, {"_id": 1}) is not None
+        return {"_id": {"$gte": since}}, still_there
+
+    async def _tail(self, handler: Handler):
+        coll = self._get_db()[self._collection]
+        last = await coll.find_one(sort=[("$natural", -1)])
+        last_id = last["_id"] if last else None
+
+        while True:
+            query, skipping = await self._resume_point(coll, last_id)
+            cursor = coll.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                while cursor.alive:
+                    async for doc in cursor:
+                        if skipping:
+                            skipping = doc["_id"] != last_id
+                            continue
+                        last_id = doc["_id"]
+                        if doc.get("type") == "init":
+                            continue
+                        doc.pop("_id", None)
+                        await handler(doc)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event tail failed, retrying")
+            await asyncio.sleep(1)
+
+    async def start(self, handler: Handler):
+        await self._ensure_collection()
+        self._task = asyncio.create_task(self._tail(handler))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def publish(self, message: dict):
+        await self._get_db()[self._collection].insert_one(dict(message))
+
+
+# -------------------------------------------------
+# LOCAL FAN-OUT
+# -------------------------------------------------
+class PubSubHub:
+    """
+    Per-process registry of subscriber queues keyed by channel
+    (a user_id). Slow subscribers drop events instead of growing
+    without bound; clients recover them on reconnect.
+    """
+
+    def __init__(self, broker: Broker, queue_size: int = 100):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+
+    @property
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def start(self):
+        await self.broker.start(self._dispatch)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    async def _dispatch(self, message: dict):
+        for queue in list(self._subscribers.get(message["channel"], ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping event for slow subscriber on {message['channel']}")
+
+    async def publish(self, channel: str, event: str, data: dict):
+        await self.broker.publish({"channel": channel, "event": event, "data": data})
+
+    def subscribe(self, channel: str, queue: asyncio.Queue | None = None) -> asyncio.Queue:
+        """
+        Pass an existing queue to receive several channels on one queue.
+        """
+        if queue is None:
+            queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[channel].add(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(channel)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[channel]
@@ -0,0 +1,91 @@
+# app/utils/question_validation.py
+
+import re
+
+OPTION_KEYS = ("A", "B", "C", "D")
+# "A", "a", "A)", "(A)", "A.", "Option A"
+OPTION_KEY_RE = re.compile(r"^\(?(?:option\s*)?([a-d])\s*[).:]?$", re.IGNORECASE)
+
+
+def _option_key(value) -> str | None:
+    match = OPTION_KEY_RE.match(str(value).strip())
+    return match.group(1).upper() if match else None
+
+
+def normalize_question(q):
+    """
+    Undo harmless formatting variations before validation: options as a
+    list, lower-case or decorated option keys, and an answer given as a
+    decorated key or as the option text itself.
+    """
+    if not isinstance(q, dict):
+        return q
+    q = dict(q)
+
+    for field in ("question_text", "explanation"):
+        if isinstance(q.get(field), str):
+            q[field] = q[field].strip()
+
+    options = q.get("options")
+    if isinstance(options, list):
+        options = dict(zip(OPTION_KEYS, options))
+    if isinstance(options, dict):
+        q["options"] = {
+            (_option_key(k) or str(k)): (v.strip() if isinstance(v, str) else v)
+            for k, v in options.items()
+        }
+
+    answer = q.get("correct_answer")
+    if isinstance(answer, str) and isinstance(q.get("options"), dict):
+        key = _option_key(answer)
+        if key is None:
+            by_text = {str(v).strip().lower(): k for k, v in q["options"].items()}
+            key = by_text.get(answer.strip().lower())
+        if key is not None:
+            q["correct_answer"] = key
+
+    return q
+
+
+def validate_question(q) -> list[str]:
+    """
+    Returns the rules a question breaks (empty when valid). Scoring in
+    submit_test needs text, options A-D and an answer among them.
+    """
+    if not isinstance(q, dict):
+        return ["not_an_object"]
+
+    errors = []
+    if not isinstance(q.get("question_text"), str) or not q["question_text"]:
+        errors.append("empty_text")
+
+    options = q.get("options")
+    if not isinstance(options, dict):
+        errors.append("options_not_object")
+        return errors + ["answer_not_in_options"]
+
+    if sorted(options) != list(OPTION_KEYS):
+        errors.append("wrong_option_keys")
+
+    values = [str(v).strip().lower() for v in options.values()]
+    if not all(values):
+        errors.append("empty_option")
+    elif len(set(values)) != len(values):
+        errors.append("duplicate_options")
+
+    if q.get("correct_answer") not in options:
+        errors.append("answer_not_in_options")
+
+    return errors
+
+
+# Human-readable versions for the regeneration prompt
+RULE_DESCRIPTIONS = {
+    "not_an_object": "the item is not a question object",
+    "empty_text": "question_text is empty",
+    "options_not_object": "options must be an object",
+    "wrong_option_keys": "options must have exactly the keys A, B, C and D",
+    "empty_option": "an option is empty",
+    "duplicate_options": "two options are identical",
+    "answer_not_in_options": "correct_answer must be one of A, B, C, D",
+}
@@ -0,0 +1,15 @@
+# app/utils/sse.py
+
+import json
+
+
+def sse_event(event: str, data: dict, event_id: str | None = None) -> str:
+    """
+    Format one Server-Sent Events frame.
+    """
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,73 @@
+# app/utils/text_index.py
+
+import re
+import zlib
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    words = TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class HashedTfidfIndex:
+    """
+    Append-only TF-IDF index using the hashing trick.
+
+    Rows are L2-normalised with the IDF known when they were added, so a
+    query is a single mat-vec product. Document frequencies keep updating
+    as rows arrive; a rebuild refreshes older rows.
+    """
+
+    def __init__(self, dim: int = 512, capacity: int = 1024):
+        self.dim = dim
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.doc_freq = np.zeros(dim, dtype=np.float32)
+        self.ids: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _term_vector(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            h = zlib.crc32(token.encode())
+            # Signed hashing keeps collisions from always adding up
+            vec[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        return np.sign(vec) * np.log1p(np.abs(vec))
+
+    def _weight(self, tf: np.ndarray) -> np.ndarray:
+        idf = np.log((1 + len(self.ids)) / (1 + self.doc_freq)) + 1
+        vec = tf * idf
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def add(self, doc_id: str, text: str):
+        tf = self._term_vector(text)
+
+        n = len(self.ids)
+        if n == len(self.matrix):
+            grown = np.zeros((n * 2, self.dim), dtype=np.float32)
+            grown[:n] = self.matrix
+            self.matrix = grown
+
+        self.doc_freq += tf != 0
+        self.ids.append(doc_id)
+        self.matrix[n] = self._weight(tf)
+
+    def search(self, text: str, k: int = 5) -> list[tuple[str, float]]:
+        n = len(self.ids)
+        if n == 0:
+            return []
+
+        query = self._weight(self._term_vector(text))
+        scores = self.matrix[:n] @ query
+
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(self.ids[i], float(scores[i])) for i in top]
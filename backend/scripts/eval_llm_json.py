@@ -0,0 +1,76 @@
+"""
+Regression and throughput check for tolerant LLM JSON extraction.
+
+Runs extract_questions over a corpus of malformed model responses
+(fences, prose, truncation, trailing commas, Python literals, ...) and
+checks how many questions each one yields. Exits non-zero on any
+mismatch, then reports parse throughput.
+
+    python scripts/eval_llm_json.py --repeat 200
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.llm_json import extract_questions  # noqa: E402
+
+CORPUS = Path(__file__).resolve().parent / "fixtures" / "malformed_llm_responses.jsonl"
+
+
+def load_corpus(path: Path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(cases: list[dict]) -> int:
+    failures = 0
+    for case in cases:
+        questions, complete = extract_questions(case["raw"])
+        ok = len(questions) == case["expect"] and complete == case["complete"]
+        failures += not ok
+        print(
+            f"{'ok  ' if ok else 'FAIL'} {case['name']:<32} "
+            f"questions={len(questions):>3}/{case['expect']:<3} complete={complete}"
+        )
+    return failures
+
+
+def throughput(cases: list[dict], repeat: int):
+    total_bytes = sum(len(case["raw"].encode()) for case in cases) * repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for case in cases:
+            extract_questions(case["raw"])
+    elapsed = time.perf_counter() - started
+
+    responses = len(cases) * repeat
+    print(
+        f"\n{responses} responses in {elapsed:.2f}s: "
+        f"{responses / elapsed:,.0f} responses/s, "
+        f"{total_bytes / elapsed / 1e6:.1f} MB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", type=Path, default=CORPUS)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    cases = load_corpus(args.corpus)
+    failures = check(cases)
+    throughput(cases, args.repeat)
+
+    if failures:
+        print(f"\n{failures} regression(s)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Parity and latency check for the progress aggregation pipeline.
+
+Seeds N synthetic test results for one student, then compares
+aggregate_student_progress (computed by Mongo) against the Python path
+(_build_summary + _summary_to_progress over the fetched history) field
+by field, and times both. Exits non-zero on any mismatch.
+
+Uses a scratch database on MONGO_URL (dropped afterwards), or
+mongomock_motor when MONGO_URL is unset.
+
+    python scripts/eval_progress_pipeline.py --sizes 100 1000 10000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import progress_service  # noqa: E402
+from app.services.progress_service import (  # noqa: E402
+    aggregate_student_progress,
+    _build_summary,
+    _summary_to_progress,
+)
+
+# Free-text subjects: "." and "$" must survive the summary's field names
+SUBJECTS = ["Physics", "Chemistry", "Biology", "Mathematics", "Maths (Std. 10)", "$GK"]
+FIELDS = [
+    "total_tests",
+    "average_score",
+    "average_accuracy",
+    "subject_performance",
+    "recent_results",
+    "improvement_trend",
+]
+
+
+def make_result(rng: random.Random, student_id: str, i: int, start: datetime) -> dict:
+    """
+    Same shape as the documents submit_test writes.
+    """
+    subject_wise = {}
+    for subject in rng.sample(SUBJECTS, rng.randint(1, len(SUBJECTS))):
+        total = rng.randint(5, 30)
+        correct = rng.randint(0, total)
+        wrong = rng.randint(0, total - correct)
+        subject_wise[subject] = {"total": total, "correct": correct, "wrong": wrong}
+
+    total = sum(s["total"] for s in subject_wise.values())
+    correct = sum(s["correct"] for s in subject_wise.values())
+    wrong = sum(s["wrong"] for s in subject_wise.values())
+    answered = correct + wrong
+
+    return {
+        "result_id": f"result_{uuid.uuid4().hex[:12]}",
+        "student_id": student_id,
+        "paper_id": f"paper_{i % 50}",
+        "paper_title": f"Mock Test {i % 50}",
+        "exam_type": rng.choice(["JEE", "NEET"]),
+        "subject": rng.choice(SUBJECTS),
+        "total_questions": total,
+        "correct_answers": correct,
+        "wrong_answers": wrong,
+        "unattempted": total - answered,
+        "score": correct * 4 - wrong,
+        "accuracy": round(correct / answered * 100, 2) if answered else 0,
+        "time_taken": rng.randint(300, 10_800),
+        "subject_wise": subject_wise,
+        "created_at": (start + timedelta(minutes=i)).isoformat(),
+    }
+
+
+async def python_progress(db, student_id: str) -> dict:
+    results = await db.test_results.find(
+        {"student_id": student_id}, {"_id": 0}
+    ).to_list(None)
+    return _summary_to_progress(_build_summary(student_id, results))
+
+
+def compare(expected: dict, actual: dict) -> list[str]:
+    return [field for field in FIELDS if expected.get(field) != actual.get(field)]
+
+
+async def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def run(db, sizes: list[int], repeat: int, seed: int) -> int:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    failures = 0
+
+    print(f"{'results':>8} {'parity':<8} {'pipeline ms':>12} {'python ms':>10}")
+    for size in sizes:
+        student_id = f"eval_{uuid.uuid4().hex[:12]}"
+        await db.test_results.insert_many(
+            [make_result(rng, student_id, i, start) for i in range(size)]
+        )
+
+        expected = await python_progress(db, student_id)
+        actual = await aggregate_student_progress(student_id)
+        mismatched = compare(expected, actual)
+        failures += bool(mismatched)
+
+        pipeline_ms = await timed(lambda: aggregate_student_progress(student_id), repeat)
+        python_ms = await timed(lambda: python_progress(db, student_id), repeat)
+
+        print(
+            f"{size:>8} {'ok' if not mismatched else 'FAIL':<8} "
+            f"{pipeline_ms:>12.1f} {python_ms:>10.1f}"
+            + (f"  mismatched: {', '.join(mismatched)}" if mismatched else "")
+        )
+
+    return failures
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    mongo_url = os.getenv("MONGO_URL")
+    db_name = f"eval_progress_{uuid.uuid4().hex[:8]}"
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+        print("MONGO_URL not set: using mongomock (timings are not representative)\n")
+
+    db = client[db_name]
+    progress_service.get_db = lambda: db
+    try:
+        failures = await run(db, args.sizes, args.repeat, args.seed)
+    finally:
+        await client.drop_database(db_name)
+
+    if failures:
+        print(f"\n{failures} parity failure(s)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Offline evaluation for the similar-doubt index.
+
+Builds a synthetic corpus of answered doubts, then queries it with noisy
+paraphrases of known doubts and reports recall@k and query latency.
+
+    python scripts/eval_similar_doubts.py --docs 100000 --queries 1000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.text_index import HashedTfidfIndex  # noqa: E402
+
+SUBJECTS = ["Physics", "Chemistry", "Biology", "Mathematics"]
+TEMPLATES = [
+    "why does {a} depend on {b} when {c} changes",
+    "how do I calculate {a} from {b} and {c}",
+    "what is the relation between {a} {b} and {c}",
+    "explain the difference between {a} and {b} in {c}",
+    "can someone solve this {a} problem using {b} and {c}",
+]
+FILLER = ["please", "help", "sir", "doubt", "question", "exam", "quickly", "again"]
+
+
+def make_vocab(rng: random.Random, size: int) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(4, 9))) for _ in range(size)]
+
+
+def make_doubt(rng: random.Random, vocab: list[str]) -> str:
+    a, b, c = rng.sample(vocab, 3)
+    extra = " ".join(rng.sample(vocab, rng.randint(2, 5)))
+    return f"{rng.choice(TEMPLATES).format(a=a, b=b, c=c)} {extra}"
+
+
+def paraphrase(rng: random.Random, text: str) -> str:
+    words = [w for w in text.split() if rng.random() > 0.25]
+    words += rng.sample(FILLER, 2)
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = {s: make_vocab(rng, 3000) for s in SUBJECTS}
+    indexes = {s: HashedTfidfIndex(dim=args.dim) for s in SUBJECTS}
+    corpus = []
+
+    started = time.perf_counter()
+    for i in range(args.docs):
+        subject = SUBJECTS[i % len(SUBJECTS)]
+        text = make_doubt(rng, vocab[subject])
+        indexes[subject].add(f"doubt_{i}", text)
+        corpus.append((f"doubt_{i}", subject, text))
+    build_s = time.perf_counter() - started
+
+    max_k = max(args.k)
+    hits = {k: 0 for k in args.k}
+    latencies = []
+
+    for doubt_id, subject, text in rng.sample(corpus, args.queries):
+        query = paraphrase(rng, text)
+
+        t0 = time.perf_counter()
+        results = indexes[subject].search(query, max_k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+        ranked = [r[0] for r in results]
+        for k in args.k:
+            if doubt_id in ranked[:k]:
+                hits[k] += 1
+
+    print(f"docs={args.docs} queries={args.queries} dim={args.dim}")
+    print(f"build: {build_s:.2f}s ({args.docs / build_s:,.0f} docs/s)")
+    for k in args.k:
+        print(f"recall@{k}: {hits[k] / args.queries:.3f}")
+    print(
+        f"latency ms: p50={percentile(latencies, 0.5):.2f} "
+        f"p99={percentile(latencies, 0.99):.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()